@@ -0,0 +1,348 @@
+"""Benchmark: /countries routes end to end, without the real upstreams
+
+Runs the FastAPI app in process against a throwaway SQLite database, with
+restcountries and the FX API replaced by a local stub server. The stub
+serves synthetic payloads (``--countries`` N countries over
+``--currencies`` M currencies) or payloads recorded with ``record``, and
+answers conditional requests like the real APIs.
+
+Scenarios:
+    refresh insert      POST /countries/refresh after DELETE /countries/flush
+    refresh changed     5% of the rates changed upstream
+    refresh forced      ?force=true, nothing changed
+    refresh 304         both upstreams answer 304
+    list filtered       GET /countries with random filters, sort and paging
+    by name             GET /countries/{name}
+    rates daily         GET /countries/{name}/rates?interval=day
+    status              GET /status
+    image               GET /countries/image
+    image 304           the same with If-None-Match
+
+Each scenario reports p50/p95/p99 latency and the SQL statements per
+request. Reads go through the read cache unless ``--cache none``.
+``--save`` writes the results as JSON and ``--baseline`` fails (exit 1)
+when a p95 grows by more than ``--tolerance`` or a scenario issues more
+statements than the baseline.
+
+The app still needs the non-database settings of Backend/.env; its own
+DATABASE_URL is replaced by a temporary SQLite file.
+
+Run from Backend/:
+    python -m benchmarks.bench_country_api
+    python -m benchmarks.bench_country_api --cache none --save base.json
+    python -m benchmarks.bench_country_api --baseline base.json
+    python -m benchmarks.bench_country_api record fixtures/
+    python -m benchmarks.bench_country_api --fixtures fixtures/
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import numpy as np
+
+
+REGIONS = ["Africa", "Americas", "Asia", "Europe", "Oceania", "Polar"]
+SORTS = [None, "gdp_desc", "population_asc", "-name", "exchange_rate"]
+
+
+def synthetic_payloads(countries: int, currencies: int, rng: random.Random):
+    """restcountries and FX payloads; about 3% of the currencies have no rate."""
+    codes = [f"C{i:03d}" for i in range(currencies)]
+    payload = [
+        {
+            "name": f"Country {i:05d}",
+            "capital": f"Capital {i}",
+            "region": rng.choice(REGIONS),
+            "population": rng.randint(10_000, 300_000_000),
+            "flag": f"https://flags.example/{i}.svg",
+            "currencies": [{"code": rng.choice(codes)}],
+        }
+        for i in range(countries)
+    ]
+    rates = {code: rng.uniform(0.1, 2000) for code in codes if rng.random() > 0.03}
+    return payload, {"result": "success", "base_code": "USD", "rates": rates}
+
+
+class StubUpstream:
+    """Serves ``/countries`` and ``/rates`` with ETags on a local port."""
+
+    def __init__(self, countries, rates):
+        self.requests = 0
+        self._bodies = {}
+        self.set("/countries", countries)
+        self.set("/rates", rates)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                body, etag = stub._bodies[self.path]
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def set(self, path: str, payload):
+        body = json.dumps(payload).encode()
+        self._bodies[path] = (body, f'"{hashlib.sha256(body).hexdigest()[:16]}"')
+
+    def close(self):
+        self.server.shutdown()
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+class Harness:
+    """The app, its database and the stub upstreams of one run."""
+
+    def __init__(self, tmp: str, countries: list, rates: dict, cache: str):
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+        os.environ["COUNTRY_HTTP_CACHE_DIR"] = f"{tmp}/http"
+        from fastapi.testclient import TestClient
+        import main
+        from country_exchange import cache as read_cache
+        from country_exchange import fetch, refresher, util
+        from country_exchange.schema import Country, RateSnapshot
+
+        # SQL echo and request logs would dominate the timings
+        main.engine.echo = False
+        logging.disable(logging.INFO)
+        main.SQLModel.metadata.create_all(
+            main.engine, tables=[Country.__table__, RateSnapshot.__table__]
+        )
+        self.upstream = StubUpstream(countries, rates)
+        fetch.COUNTRY_URL = f"{self.upstream.url}/countries"
+        fetch.RATE_URL = f"{self.upstream.url}/rates"
+        refresher.http_cache = fetch.HTTPCache(f"{tmp}/http")
+        util.IMAGE_PATH = Path(tmp) / "summary.png"
+        read_cache.country_cache.backend = read_cache.create_cache(cache).backend
+
+        self.main = main
+        self.util = util
+        self.rates = rates
+        self.names = [c["name"] for c in countries]
+        self.codes = sorted({c["currencies"][0]["code"] for c in countries})
+        self.client = TestClient(main.app)
+        self.statements = StatementCounter(main.engine)
+
+    def flush(self):
+        response = self.client.delete("/countries/flush")
+        if response.status_code >= 400:
+            raise RuntimeError(f"flush: {response.status_code}")
+
+    def change_rates(self, share: float, rng: random.Random):
+        rates = dict(self.rates["rates"])
+        for code in rng.sample(sorted(rates), max(1, int(len(rates) * share))):
+            rates[code] *= rng.uniform(0.9, 1.1)
+        self.rates = {**self.rates, "rates": rates}
+        self.upstream.set("/rates", self.rates)
+
+    def wait_for_image(self):
+        self.util._render_executor.submit(lambda: None).result()
+
+    def measure(self, requests: int, send, before=None):
+        """Latencies (s) and statement counts of ``requests`` calls."""
+        latencies, statements = [], []
+        for i in range(requests):
+            if before is not None:
+                before(i)
+            start_count = self.statements.count
+            start = time.perf_counter()
+            response = send(i)
+            latencies.append(time.perf_counter() - start)
+            statements.append(self.statements.count - start_count)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{response.request.url}: {response.status_code}")
+        self.wait_for_image()
+        return latencies, statements
+
+
+def scenarios(h: Harness, rng: random.Random, requests: int, refreshes: int):
+    client = h.client
+
+    def refresh(force):
+        return lambda i: client.post(f"/countries/refresh?force={str(force).lower()}")
+
+    def filtered(i):
+        params = {"limit": 50, "offset": rng.choice([0, 0, 50])}
+        if rng.random() < 0.5:
+            params["region"] = rng.choice(REGIONS)
+        if rng.random() < 0.5:
+            params["currency_code"] = rng.choice(h.codes)
+        sort = rng.choice(SORTS)
+        if sort:
+            params["sort"] = sort
+        response = client.get("/countries", params=params)
+        # no match is a valid outcome of a random filter
+        if response.status_code == 404:
+            response.status_code = 200
+        return response
+
+    etag = {}
+
+    def image(i):
+        response = client.get("/countries/image")
+        etag["value"] = response.headers.get("etag")
+        return response
+
+    yield "refresh insert", refreshes, refresh(False), lambda i: h.flush()
+    yield "refresh changed", refreshes, refresh(False), lambda i: h.change_rates(
+        0.05, rng
+    )
+    yield "refresh forced", refreshes, refresh(True), None
+    yield "refresh 304", refreshes, refresh(False), None
+    yield "list filtered", requests, filtered, None
+    yield "by name", requests, lambda i: client.get(
+        f"/countries/{rng.choice(h.names)}"
+    ), None
+    yield "rates daily", requests, lambda i: client.get(
+        f"/countries/{rng.choice(h.names)}/rates", params={"interval": "day"}
+    ), None
+    yield "status", requests, lambda i: client.get("/status"), None
+    yield "image", requests, image, None
+    yield "image 304", requests, lambda i: client.get(
+        "/countries/image", headers={"If-None-Match": etag["value"]}
+    ), None
+
+
+def summarise(latencies, statements) -> dict:
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1e3, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "statements": round(float(np.mean(statements)), 2),
+    }
+
+
+def run(
+    countries: list,
+    rates: dict,
+    requests: int = 200,
+    refreshes: int = 10,
+    cache: str = "memory",
+    seed: int = 0,
+):
+    rng = random.Random(seed)
+    results = {}
+    print(
+        f"{'scenario':<16} {'n':>5} {'p50 (ms)':>9} {'p95 (ms)':>9}"
+        f" {'p99 (ms)':>9} {'stmts/req':>10}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        h = Harness(tmp, countries, rates, cache)
+        try:
+            for name, n, send, before in scenarios(h, rng, requests, refreshes):
+                results[name] = r = summarise(*h.measure(n, send, before))
+                print(
+                    f"{name:<16} {r['requests']:>5} {r['p50_ms']:>9.2f}"
+                    f" {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f}"
+                    f" {r['statements']:>10.2f}"
+                )
+        finally:
+            h.upstream.close()
+            h.main.engine.dispose()
+    return results
+
+
+def regressions(results: dict, baseline: dict, tolerance: float):
+    found = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            found.append(f"{name}: p95 {base['p95_ms']} -> {current['p95_ms']} ms")
+        if current["statements"] > base["statements"]:
+            found.append(
+                f"{name}: statements {base['statements']} -> {current['statements']}"
+            )
+    return found
+
+
+def record(directory: str):
+    """Save the live upstream payloads for ``--fixtures``."""
+    import httpx
+    from country_exchange.fetch import COUNTRY_URL, RATE_URL
+
+    os.makedirs(directory, exist_ok=True)
+    for url, name in ((COUNTRY_URL, "countries.json"), (RATE_URL, "rates.json")):
+        response = httpx.get(url, timeout=30, follow_redirects=True)
+        response.raise_for_status()
+        Path(directory, name).write_bytes(response.content)
+        print(f"Saved {url} to {Path(directory, name)}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Country API benchmark")
+    parser.add_argument("action", nargs="?", default="run", choices=["run", "record"])
+    parser.add_argument("directory", nargs="?", help="fixture directory to record")
+    parser.add_argument("--countries", type=int, default=250)
+    parser.add_argument("--currencies", type=int, default=150)
+    parser.add_argument("--fixtures", help="directory with recorded payloads")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--refreshes", type=int, default=10)
+    parser.add_argument("--cache", default="memory", choices=["memory", "none"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    if args.action == "record":
+        record(args.directory or "fixtures")
+        sys.exit(0)
+
+    if args.fixtures:
+        countries = json.loads(Path(args.fixtures, "countries.json").read_text())
+        rates = json.loads(Path(args.fixtures, "rates.json").read_text())
+    else:
+        countries, rates = synthetic_payloads(
+            args.countries, args.currencies, random.Random(args.seed)
+        )
+
+    results = run(
+        countries, rates, args.requests, args.refreshes, args.cache, args.seed
+    )
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2))
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        found = regressions(results, baseline, args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if found else 0)
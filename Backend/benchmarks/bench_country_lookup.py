@@ -0,0 +1,103 @@
+"""Benchmark: /countries/{name} style lookups with and without indexes
+
+Fills a throwaway SQLite database with synthetic countries (real regions,
+made-up sub-region names) and times lookups by name and filters by region
+and currency code as the table grows. With the ``Country`` indexes the
+lookup time stays flat; the unindexed copy scans the table. The currency
+filter returns more rows as the table grows, so its indexed time follows
+the number of matches rather than the table size.
+
+Run from Backend/:
+    python -m benchmarks.bench_country_lookup
+"""
+
+import os
+import random
+import tempfile
+import timeit
+from datetime import datetime, timezone
+from uuid import uuid4
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel, create_engine, select
+from country_exchange.schema import Country
+
+
+SIZES = [1_000, 10_000, 100_000]
+REGIONS = ["Africa", "Americas", "Asia", "Europe", "Oceania", "Polar"]
+CURRENCIES = ["USD", "EUR", "NGN", "GBP", "JPY", "KES", "INR", "BRL"]
+LOOKUPS = 200
+
+
+def synthetic_countries(count: int, rng: random.Random):
+    now = datetime.now(timezone.utc)
+    for i in range(count):
+        region = rng.choice(REGIONS)
+        yield {
+            "id": uuid4(),
+            "name": f"{region} Sub-region {i:06d}",
+            "capital": f"Capital {i}",
+            "region": region,
+            "population": rng.randint(1_000, 100_000_000),
+            "currency_code": f"{rng.choice(CURRENCIES)}{i % 97}",
+            "exchange_rate": rng.uniform(0.1, 1000),
+            "estimated_gdp": rng.uniform(1e6, 1e12),
+            "flag_url": None,
+            "last_refreshed_at": now,
+        }
+
+
+def build(path: str, size: int, indexed: bool, seed: int):
+    engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine, tables=[Country.__table__])
+    if not indexed:
+        with engine.begin() as conn:
+            for index in Country.__table__.indexes:
+                conn.exec_driver_sql(f"DROP INDEX {index.name}")
+    rows = list(synthetic_countries(size, random.Random(seed)))
+    with engine.begin() as conn:
+        conn.execute(insert(Country), rows)
+    return engine, [r["name"] for r in rows], [r["currency_code"] for r in rows]
+
+
+def time_lookups(engine, names, currencies, rng: random.Random):
+    picks = rng.sample(names, min(LOOKUPS, len(names)))
+    codes = rng.sample(currencies, min(LOOKUPS, len(currencies)))
+    with Session(engine) as db:
+
+        def by_name():
+            for name in picks:
+                db.exec(select(Country).where(Country.name == name)).first()
+
+        def by_currency():
+            for code in codes:
+                db.exec(select(Country.id).where(Country.currency_code == code)).all()
+
+        t_name = min(timeit.repeat(by_name, number=1, repeat=3)) / len(picks)
+        t_currency = min(timeit.repeat(by_currency, number=1, repeat=3)) / len(codes)
+    return t_name, t_currency
+
+
+def run(sizes=SIZES, seed: int = 0):
+    print(
+        f"{'rows':>8} {'name (us)':>10} {'no index':>10}"
+        f" {'currency (us)':>14} {'no index':>10}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            results = {}
+            for indexed in (True, False):
+                path = os.path.join(tmp, f"{size}-{indexed}.db")
+                engine, names, currencies = build(path, size, indexed, seed)
+                results[indexed] = time_lookups(
+                    engine, names, currencies, random.Random(seed)
+                )
+                engine.dispose()
+            (n_idx, c_idx), (n_scan, c_scan) = results[True], results[False]
+            print(
+                f"{size:>8} {n_idx * 1e6:>10.1f} {n_scan * 1e6:>10.1f}"
+                f" {c_idx * 1e6:>14.1f} {c_scan * 1e6:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,127 @@
+"""Benchmark: columnar country ingestion against the per-row loop
+
+Builds synthetic restcountries and FX payloads (a few percent invalid rows,
+a few currencies without a rate) and times:
+
+    row loop     validate and compute GDP per country, one ``Country`` each
+    columns      ``build_batch``: stages 1 and 2 on NumPy arrays
+    re-refresh   ``build_batch`` + ``select_changes`` against the stored
+                 content hashes, with 1% of the rows changed
+
+Run from Backend/:
+    python -m benchmarks.bench_country_pipeline
+"""
+
+import io
+import random
+import timeit
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from country_exchange.pipeline import build_batch, select_changes
+from country_exchange.schema import Country, calculate_estimated_gdp
+
+
+SIZES = [1_000, 10_000, 100_000]
+CURRENCIES = [f"C{i:02d}" for i in range(160)]
+
+
+def synthetic_payload(count: int, rng: random.Random):
+    countries = []
+    for i in range(count):
+        population = rng.randint(1_000, 100_000_000)
+        if rng.random() < 0.02:
+            population = 0
+        countries.append(
+            {
+                "name": f"Country {i:06d}",
+                "capital": f"Capital {i}",
+                "region": rng.choice(["Africa", "Americas", "Asia", "Europe"]),
+                "population": population,
+                "flag": f"https://flags.example/{i}.svg",
+                "currencies": [{"code": rng.choice(CURRENCIES)}],
+            }
+        )
+    rates = {code: rng.uniform(0.1, 1000) for code in CURRENCIES[:-10]}
+    return countries, rates
+
+
+def row_loop(countries: list, rates: dict):
+    """The per-row ingestion the pipeline replaced."""
+    out = []
+    for country in countries:
+        population = country.get("population")
+        currencies = country.get("currencies", [])
+        currency_code = None
+        if isinstance(currencies, list) and currencies:
+            currency_code = (currencies[0] or {}).get("code")
+        if not country.get("name") or not population or not currency_code:
+            print({"error": "Validation failed", "country": country.get("name")})
+            continue
+        rate = rates.get(currency_code)
+        gdp = calculate_estimated_gdp(population, rate) if rate is not None else None
+        out.append(
+            Country(
+                name=country["name"],
+                capital=country.get("capital"),
+                region=country.get("region"),
+                population=population,
+                currency_code=currency_code,
+                exchange_rate=rate,
+                estimated_gdp=gdp,
+                flag_url=country.get("flag"),
+                last_refreshed_at=datetime.now(timezone.utc),
+            )
+        )
+    return out
+
+
+def stored_values(countries: list, rates: dict, changed_every: int = 100):
+    batch = build_batch(countries, rates, seed=0)
+    c = batch.columns
+    stored = {}
+    for i, name in enumerate(c["name"]):
+        stored[name] = {
+            "content_hash": c["content_hash"][i] if i % changed_every else "stale",
+            "estimated_gdp": c["estimated_gdp"][i],
+        }
+    return stored
+
+
+def measure(countries: list, rates: dict, seed: int):
+    """Validation errors are printed per row, so stdout is captured."""
+    stored = stored_values(countries, rates)
+    repeat = 3 if len(countries) < 100_000 else 1
+
+    def refresh():
+        return select_changes(build_batch(countries, rates, seed=seed), stored)
+
+    t_loop = min(
+        timeit.repeat(lambda: row_loop(countries, rates), number=1, repeat=repeat)
+    )
+    t_columns = min(
+        timeit.repeat(
+            lambda: build_batch(countries, rates, seed=seed), number=1, repeat=repeat
+        )
+    )
+    t_refresh = min(timeit.repeat(refresh, number=1, repeat=repeat))
+    return t_loop, t_columns, t_refresh, len(refresh())
+
+
+def run(sizes=SIZES, seed: int = 0):
+    print(
+        f"{'rows':>8} {'row loop (ms)':>14} {'columns (ms)':>13}"
+        f" {'re-refresh (ms)':>16} {'rows written':>13}"
+    )
+    for size in sizes:
+        countries, rates = synthetic_payload(size, random.Random(seed))
+        with redirect_stdout(io.StringIO()):
+            result = measure(countries, rates, seed)
+        t_loop, t_columns, t_refresh, written = result
+        print(
+            f"{size:>8} {t_loop * 1e3:>14.1f} {t_columns * 1e3:>13.1f}"
+            f" {t_refresh * 1e3:>16.1f} {written:>13}"
+        )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,58 @@
+"""Micro-benchmark: fused analyse_string against the per-property functions
+
+Run from Backend/:
+    python -m benchmarks.bench_string_analyzer
+"""
+
+import random
+import string
+import timeit
+from string_analyzers.string_analyzer import (
+    analyse_string,
+    palindrome,
+    unique_char,
+    word_count,
+    sha256_hash,
+    character_frequency_map,
+)
+
+
+SIZES = [100, 10_000, 1_000_000, 5_000_000]
+ALPHABET = string.ascii_letters + string.digits + "     ,.!"
+
+
+def separate(data: str):
+    """What analyse_data used to do, one helper per property."""
+    return {
+        "id": sha256_hash(data),
+        "length": len(data),
+        "is_palindrome": palindrome(data),
+        "unique_characters": unique_char(data),
+        "word_count": word_count(data),
+        "sha256_hash": sha256_hash(data),
+        "character_frequency_map": character_frequency_map(data),
+    }
+
+
+def run(sizes=SIZES, seed: int = 0):
+    rng = random.Random(seed)
+    print(f"{'size':>10} {'separate (s)':>14} {'fused (s)':>12} {'speedup':>9}")
+    for size in sizes:
+        data = "".join(rng.choices(ALPHABET, k=size))
+        number = max(1, 200_000 // size)
+
+        fused = analyse_string(data)
+        legacy = separate(data)
+        assert all(fused[k] == legacy[k] for k in fused), "results differ"
+
+        t_sep = min(timeit.repeat(lambda: separate(data), number=number, repeat=3))
+        t_fused = min(
+            timeit.repeat(lambda: analyse_string(data), number=number, repeat=3)
+        )
+        t_sep /= number
+        t_fused /= number
+        print(f"{size:>10} {t_sep:>14.6f} {t_fused:>12.6f} {t_sep / t_fused:>8.1f}x")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,100 @@
+"""Read-through cache for the country read endpoints
+
+Responses of /countries, /countries/{name} and /status are cached under
+the current data version plus the endpoint's normalised parameters.
+Refresh, flush and delete bump the version, which makes every older entry
+unreachable at once. Entries also expire after ``COUNTRY_CACHE_TTL``
+seconds as a safety net for writes made outside this app.
+
+The storage is pluggable: ``MemoryBackend`` keeps entries in this process
+and ``NullBackend`` disables caching (``COUNTRY_CACHE_BACKEND=none``). A
+backend shared between workers, e.g. on Redis, only has to provide the
+same four methods, with the version stored alongside the entries.
+"""
+
+import json
+import os
+import threading
+from typing import Any, Callable, Optional, Tuple
+from cachetools import TTLCache
+
+
+CACHE_BACKEND = os.getenv("COUNTRY_CACHE_BACKEND", "memory")
+CACHE_SIZE = int(os.getenv("COUNTRY_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("COUNTRY_CACHE_TTL", "300"))
+
+
+class MemoryBackend:
+    """Entries in a TTL/LRU map local to this process."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Any]]:
+        with self._lock:
+            return self._entries.get(key)
+
+    def set(self, key: str, value: Tuple[Any]):
+        with self._lock:
+            self._entries[key] = value
+
+    def version(self) -> int:
+        return self._version
+
+    def bump_version(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+
+class NullBackend:
+    """Caches nothing."""
+
+    def get(self, key: str):
+        return None
+
+    def set(self, key: str, value):
+        pass
+
+    def version(self) -> int:
+        return 0
+
+    def bump_version(self):
+        pass
+
+
+class ReadCache:
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else MemoryBackend()
+
+    def key(self, namespace: str, params: dict) -> str:
+        params = {k: v for k, v in params.items() if v is not None}
+        encoded = json.dumps(params, sort_keys=True, default=str)
+        return f"{self.backend.version()}:{namespace}:{encoded}"
+
+    def get_or_load(self, namespace: str, params: dict, load: Callable[[], Any]):
+        """Cached value for ``params``, calling ``load`` on a miss."""
+        key = self.key(namespace, params)
+        hit = self.backend.get(key)
+        if hit is not None:
+            return hit[0]
+        value = load()
+        # wrapped so a cached None is not taken for a miss
+        self.backend.set(key, (value,))
+        return value
+
+    def invalidate(self):
+        self.backend.bump_version()
+
+
+def create_cache(backend: str = CACHE_BACKEND) -> ReadCache:
+    if backend == "memory":
+        return ReadCache(MemoryBackend())
+    if backend == "none":
+        return ReadCache(NullBackend())
+    raise ValueError(f"Unknown COUNTRY_CACHE_BACKEND {backend!r}")
+
+
+country_cache = create_cache()
@@ -0,0 +1,190 @@
+"""Database operations for the country exchange endpoints"""
+
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, update
+from sqlalchemy import select as sa_select
+from sqlmodel import Session, select
+from .schema import Country
+
+
+COUNTRY_FIELDS = (
+    "capital",
+    "region",
+    "population",
+    "currency_code",
+    "exchange_rate",
+    "estimated_gdp",
+    "flag_url",
+    "content_hash",
+)
+
+
+def upsert_countries(
+    db: Session, countries: List[Country], existing: Optional[Dict[str, Any]] = None
+):
+    """Insert new countries and update existing ones, matched by name.
+
+    Existing ids are read in one query and the changes are written as one
+    executemany INSERT and one executemany UPDATE, whatever the number of
+    countries. Returns the merged countries with the inserted and updated
+    counts; the returned objects are not attached to ``db``. ``existing``
+    maps stored names to ids when the caller already read them.
+    """
+    now = datetime.now(timezone.utc)
+    incoming = {c.name: c for c in countries}
+    if existing is None:
+        existing = dict(
+            db.exec(
+                select(Country.name, Country.id).where(Country.name.in_(list(incoming)))
+            ).all()
+        )
+
+    inserts, updates, merged = [], [], []
+    for name, country in incoming.items():
+        values = {field: getattr(country, field) for field in COUNTRY_FIELDS}
+        values.update(name=name, last_refreshed_at=now)
+        if name in existing:
+            values["id"] = existing[name]
+            updates.append(values)
+        else:
+            values["id"] = country.id
+            inserts.append(values)
+        merged.append(Country(**values))
+
+    if inserts:
+        db.execute(insert(Country), inserts)
+    if updates:
+        db.execute(update(Country), updates)
+    db.commit()
+
+    return merged, len(inserts), len(updates)
+
+
+def stored_countries(db: Session) -> Dict[str, dict]:
+    """Id, content hash and GDP of every stored country, by name."""
+    rows = db.execute(
+        sa_select(Country.name, Country.id, Country.content_hash, Country.estimated_gdp)
+    ).mappings()
+    return {row["name"]: dict(row) for row in rows}
+
+
+def delete_countries(db: Session, names) -> int:
+    """Delete the named countries, without committing."""
+    names = list(names)
+    if names:
+        db.exec(delete(Country).where(Country.name.in_(names)))
+    return len(names)
+
+
+TEXT_FILTERS = ("name", "region", "capital", "currency_code")
+# like the text filters, a 0 (or empty) value means "no filter"
+EQUALITY_FILTERS = ("population", "estimated_gdp", "exchange_rate")
+NUMBER_FILTERS = {
+    "population": Country.population,
+    "gdp": Country.estimated_gdp,
+    "exchange_rate": Country.exchange_rate,
+}
+SORT_COLUMNS = {
+    "name": Country.name,
+    "region": Country.region,
+    "capital": Country.capital,
+    "currency_code": Country.currency_code,
+    "population": Country.population,
+    "gdp": Country.estimated_gdp,
+    "estimated_gdp": Country.estimated_gdp,
+    "exchange_rate": Country.exchange_rate,
+    "last_refreshed_at": Country.last_refreshed_at,
+}
+RESPONSE_COLUMNS = [
+    c for c in Country.__table__.columns if c.name not in ("id", "content_hash")
+]
+
+
+def normalise_filters(filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Filters that give the same result map to the same cache key."""
+    normalised = {}
+    for field, value in filters.items():
+        if value is None or (field in TEXT_FILTERS + EQUALITY_FILTERS and not value):
+            continue
+        normalised[field] = value.lower() if field in TEXT_FILTERS else value
+    return normalised
+
+
+def parse_sort(sort: Optional[str]):
+    """ORDER BY for ``gdp_desc``, ``population_asc``, ``-name`` or ``name``."""
+    if not sort:
+        return [Country.name]
+    key, descending = sort, False
+    if key.startswith("-"):
+        key, descending = key[1:], True
+    elif key.endswith(("_asc", "_desc")):
+        key, _, direction = key.rpartition("_")
+        descending = direction == "desc"
+    column = SORT_COLUMNS.get(key)
+    if column is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid sort '{sort}', use one of {', '.join(SORT_COLUMNS)}",
+        )
+    # name breaks ties so pages are stable
+    return [column.desc() if descending else column.asc(), Country.name]
+
+
+def query_countries(
+    db: Session,
+    filters: Dict[str, Any],
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> List[dict]:
+    """Countries matching ``filters`` as plain column dicts.
+
+    Text filters are case-insensitive substring matches, ``population``,
+    ``estimated_gdp`` and ``exchange_rate`` are equality matches and
+    ``min_<x>``/``max_<x>`` (x in population, gdp, exchange_rate) are
+    inclusive ranges. Empty text and zero equality values are ignored. Everything, including paging, runs in the database.
+    """
+    conditions = []
+    for field in TEXT_FILTERS:
+        value = filters.get(field)
+        if value:
+            conditions.append(
+                func.lower(getattr(Country, field)).contains(
+                    value.lower(), autoescape=True
+                )
+            )
+    for field in EQUALITY_FILTERS:
+        value = filters.get(field)
+        if value:
+            conditions.append(getattr(Country, field) == value)
+    for name, column in NUMBER_FILTERS.items():
+        low, high = filters.get(f"min_{name}"), filters.get(f"max_{name}")
+        if low is not None:
+            conditions.append(column >= low)
+        if high is not None:
+            conditions.append(column <= high)
+
+    stmt = (
+        sa_select(*RESPONSE_COLUMNS)
+        .where(*conditions)
+        .order_by(*parse_sort(sort))
+        .offset(offset)
+    )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return [dict(row) for row in db.execute(stmt).mappings()]
+
+
+def get_country_row(db: Session, name: str) -> Optional[dict]:
+    country = db.exec(select(Country).where(Country.name == name)).first()
+    return country.model_dump() if country else None
+
+
+def country_summary(db: Session) -> dict:
+    """Row count and latest refresh time in one aggregate query."""
+    total, last_refreshed_at = db.exec(
+        select(func.count(), func.max(Country.last_refreshed_at))
+    ).one()
+    return {"total_countries": total, "last_refreshed_at": last_refreshed_at}
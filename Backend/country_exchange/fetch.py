@@ -1,87 +1,207 @@
-"""Fetch data from external API"""
-
-import requests
+"""Fetch data from external API
+
+Both sources are fetched concurrently with ``httpx.AsyncClient``, so a
+refresh waits for the slower source rather than for both in turn. Requests
+have a timeout and are retried with exponential backoff on connection
+errors, 429 and 5xx. The URLs can be pointed at a local stub server with
+``COUNTRY_API_URL`` and ``EXCHANGE_RATE_API_URL``.
+
+``HTTPCache`` keeps each source's ETag/Last-Modified and parsed body on
+disk (``cache/http``), so refreshes send conditional requests and a 304
+reuses the stored body instead of downloading and parsing it again.
+The payloads are parsed into a ``CountryBatch`` by ``pipeline``.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import httpx
+from pathlib import Path
+from typing import Optional, Tuple
 from fastapi import HTTPException
-from .schema import Country, calculate_estimated_gdp
-from datetime import datetime, timezone
-
-
-def country_data():
-    """Fetch country data"""
-    COUNTRY_URL = "https://restcountries.com/v2/all?fields=name,capital,region,population,flag,currencies"
-    RATE_URL = "https://open.er-api.com/v6/latest/USD"
-
-    country_response = requests.get(COUNTRY_URL)
-    exchange_rate_response = requests.get(RATE_URL)
-
-    if country_response.status_code != 200:
-        raise HTTPException(
-            status_code=503,
-            detail={
-                "error": "External data source unavailable",
-                "details": "Could not fetch data from {COUNTRY_URL}",
-            },
-        )
-    if exchange_rate_response.status_code != 200:
-        raise HTTPException(
-            status_code=503,
-            detail={
-                "error": "External data source unavailable",
-                "details": "Could not fetch data from {RATE_URL}",
-            },
+from .pipeline import CountryBatch, build_batch
+
+
+COUNTRY_URL = os.getenv(
+    "COUNTRY_API_URL",
+    "https://restcountries.com/v2/all?fields=name,capital,region,population,flag,currencies",
+)
+RATE_URL = os.getenv("EXCHANGE_RATE_API_URL", "https://open.er-api.com/v6/latest/USD")
+FETCH_TIMEOUT = float(os.getenv("COUNTRY_FETCH_TIMEOUT", "10"))
+FETCH_RETRIES = int(os.getenv("COUNTRY_FETCH_RETRIES", "3"))
+FETCH_BACKOFF = float(os.getenv("COUNTRY_FETCH_BACKOFF", "0.5"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+HTTP_CACHE_DIR = os.getenv(
+    "COUNTRY_HTTP_CACHE_DIR", str(Path(__file__).parent.parent / "cache" / "http")
+)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(timeout=FETCH_TIMEOUT, follow_redirects=True)
+
+
+def http_client() -> httpx.AsyncClient:
+    """Shared client, so refreshes reuse pooled connections."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = new_client()
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def source_unavailable(url: str):
+    return HTTPException(
+        status_code=503,
+        detail={
+            "error": "External data source unavailable",
+            "details": f"Could not fetch data from {url}",
+        },
+    )
+
+
+class HTTPCache:
+    """Validators and parsed bodies of fetched URLs, one JSON file each.
+
+    ``put`` only stages a response. It is used for conditional requests
+    once ``commit`` is called, i.e. after the refresh that read it has been
+    stored, so a failed refresh does not turn the next one into a 304.
+    """
+
+    def __init__(self, directory: str = HTTP_CACHE_DIR):
+        self.directory = directory
+        self._entries = {}
+        self._staged = {}
+
+    def _path(self, url: str) -> str:
+        name = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def get(self, url: str) -> Optional[dict]:
+        if url not in self._entries:
+            try:
+                with open(self._path(url)) as f:
+                    self._entries[url] = json.load(f)
+            except (OSError, ValueError):
+                return None
+        return self._entries[url]
+
+    def put(self, url: str, response: httpx.Response, body):
+        self._staged[url] = {
+            "url": url,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "body": body,
+        }
+
+    def commit(self):
+        staged, self._staged = self._staged, {}
+        for url, entry in staged.items():
+            self._entries[url] = entry
+            if not entry["etag"] and not entry["last_modified"]:
+                continue
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(url))
+
+    def discard(self):
+        self._staged = {}
+
+    def clear(self):
+        """Forget every URL, so the next fetch downloads the full bodies."""
+        urls = set(self._entries) | set(self._staged) | {COUNTRY_URL, RATE_URL}
+        self._entries, self._staged = {}, {}
+        for url in urls:
+            try:
+                os.remove(self._path(url))
+            except FileNotFoundError:
+                pass
+
+
+http_cache = HTTPCache()
+
+
+async def get_with_retries(client: httpx.AsyncClient, url: str, headers=None):
+    """GET ``url``, retrying transient failures with backoff."""
+    for attempt in range(FETCH_RETRIES + 1):
+        try:
+            response = await client.get(url, headers=headers)
+        except httpx.TransportError:
+            response = None
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            break
+        if attempt < FETCH_RETRIES:
+            await asyncio.sleep(FETCH_BACKOFF * 2**attempt)
+
+    if response is None or response.status_code not in (200, 304):
+        raise source_unavailable(url)
+    return response
+
+
+async def fetch_json(client: httpx.AsyncClient, url: str):
+    """GET ``url`` as JSON"""
+    response = await get_with_retries(client, url)
+    return response.json()
+
+
+async def fetch_cached(
+    client: httpx.AsyncClient, url: str, cache: HTTPCache, force: bool = False
+) -> Tuple[object, bool]:
+    """JSON body of ``url`` and whether it changed since the cached copy."""
+    entry = None if force else cache.get(url)
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = await get_with_retries(client, url, headers)
+    if response.status_code == 304 and entry is not None:
+        return entry["body"], False
+    if response.status_code == 304:
+        raise source_unavailable(url)
+    body = response.json()
+    cache.put(url, response, body)
+    return body, True
+
+
+async def country_data_async(
+    client: Optional[httpx.AsyncClient] = None,
+    cache: Optional[HTTPCache] = None,
+    force: bool = False,
+) -> Optional[CountryBatch]:
+    """Fetch both sources at once and parse them into countries
+
+    With a ``cache`` the requests are conditional and None is returned when
+    neither source changed upstream; ``force`` ignores the cached copies.
+    New responses are only staged in ``cache``; the caller commits them.
+    """
+    client = client or http_client()
+    if cache is None:
+        countries, exchange_rates = await asyncio.gather(
+            fetch_json(client, COUNTRY_URL), fetch_json(client, RATE_URL)
         )
+        return build_batch(countries, exchange_rates["rates"])
 
-    countries = country_response.json()
-    exchange_rate_data = exchange_rate_response.json()["rates"]
-
-    all_countries = []
-    error_log = []
-    for country in countries:
-        errors = {}
-
-        name = country.get("name")
-        population = country.get("population")
-        currencies = country.get("currencies", [])
-
-        if not name:
-            errors["name"] = "is required"
-        if not population or not isinstance(population, int) or population <= 0:
-            errors["population"] = "must be a positive integer"
-
-        currency_code = None
-        exchange_rate = None
-        estimated_gdp = 0
-
-        if isinstance(currencies, list) and len(currencies) > 0:
-            first_currency = currencies[0] or {}
-            currency_code = first_currency.get("code")
-
-        if not currency_code:
-            errors["currency_code"] = "is required"
-        exchange_rate = exchange_rate_data.get(currency_code)
-        if exchange_rate is not None:
-            estimated_gdp = calculate_estimated_gdp(population, exchange_rate)
-        else:
-            exchange_rate = None
-            estimated_gdp = None
-
-        if errors:
-            error_log.append({"country": name, "details": errors})
-            print({"error": "Validation failed", "details": errors, "country": name})
-            continue
-
-        new_country = Country(
-            name=country.get("name"),
-            capital=country.get("capital"),
-            region=country.get("region"),
-            population=population,
-            currency_code=currency_code,
-            exchange_rate=exchange_rate,
-            estimated_gdp=estimated_gdp,
-            flag_url=country.get("flag"),
-            last_refreshed_at=datetime.now(timezone.utc),
+    (countries, countries_changed), (exchange_rates, rates_changed) = (
+        await asyncio.gather(
+            fetch_cached(client, COUNTRY_URL, cache, force),
+            fetch_cached(client, RATE_URL, cache, force),
         )
-
-        all_countries.append(new_country)
-
-    return all_countries
+    )
+    if not (countries_changed or rates_changed):
+        return None
+    if not isinstance(exchange_rates, dict) or "rates" not in exchange_rates:
+        raise source_unavailable(RATE_URL)
+    return build_batch(countries, exchange_rates["rates"])
@@ -0,0 +1,168 @@
+"""Exchange-rate history
+
+Every refresh that parses new data appends one ``RateSnapshot`` per
+currency whose rate differs from its latest snapshot, so past rates survive
+the overwrite of ``Country.exchange_rate`` without a forced refresh, or one
+where only the countries changed, repeating them. Rows are never updated. Range queries go
+through the (currency_code, recorded_at) index; daily rollups are grouped
+in SQL on the stored ``day``, through the (currency_code, day) index, and
+weekly ones are combined from the daily rows, so neither reads the raw
+snapshots of the range into Python.
+"""
+
+import math
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, List
+import numpy as np
+from fastapi import HTTPException
+from sqlalchemy import insert
+from sqlmodel import Session, func, select
+from .pipeline import CountryBatch
+from .schema import RateSnapshot
+
+
+INTERVALS = ("raw", "day", "week")
+MAX_RAW_POINTS = 10_000
+# rates are compared loosely, a FLOAT column may not round-trip a double
+RATE_TOLERANCE = 1e-6
+
+
+def as_utc(moment: datetime) -> datetime:
+    """``moment`` as an aware UTC datetime, naive values being UTC."""
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def _naive_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def latest_rates(db: Session, codes: List[str]) -> Dict[str, float]:
+    """Most recent recorded rate of each of ``codes`` that has one."""
+    if not codes:
+        return {}
+    newest = (
+        select(
+            RateSnapshot.currency_code, func.max(RateSnapshot.recorded_at).label("at")
+        )
+        .where(RateSnapshot.currency_code.in_(codes))
+        .group_by(RateSnapshot.currency_code)
+        .subquery()
+    )
+    rows = db.exec(
+        select(RateSnapshot.currency_code, RateSnapshot.rate).join(
+            newest,
+            (RateSnapshot.currency_code == newest.c.currency_code)
+            & (RateSnapshot.recorded_at == newest.c.at),
+        )
+    ).all()
+    return dict(rows)
+
+
+def record_rates(db: Session, countries: CountryBatch, now: datetime) -> int:
+    """Append the batch's changed exchange rates, without committing."""
+    now = _naive_utc(now)
+    c = countries.columns
+    known = ~np.isnan(c["exchange_rate"])
+    codes, first = np.unique(c["currency_code"][known].astype(str), return_index=True)
+    rates = c["exchange_rate"][known][first]
+    latest = latest_rates(db, codes.tolist())
+    rows = [
+        {
+            "currency_code": code,
+            "rate": float(rate),
+            "recorded_at": now,
+            "day": now.date(),
+        }
+        for code, rate in zip(codes.tolist(), rates)
+        if code not in latest
+        or not math.isclose(latest[code], rate, rel_tol=RATE_TOLERANCE)
+    ]
+    if rows:
+        db.execute(insert(RateSnapshot), rows)
+    return len(rows)
+
+
+def rate_history(
+    db: Session, currency_code: str, start: datetime, end: datetime, interval: str
+) -> List[dict]:
+    """Rates of ``currency_code`` recorded in [start, end], oldest first.
+
+    ``raw`` returns every snapshot; ``day`` and ``week`` (starting Monday)
+    return the mean, min, max and number of snapshots per period.
+    """
+    if interval not in INTERVALS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid interval '{interval}', use one of {', '.join(INTERVALS)}",
+        )
+    in_range = (
+        RateSnapshot.currency_code == currency_code,
+        RateSnapshot.recorded_at >= _naive_utc(start),
+        RateSnapshot.recorded_at <= _naive_utc(end),
+    )
+
+    if interval == "raw":
+        rows = db.exec(
+            select(RateSnapshot.recorded_at, RateSnapshot.rate)
+            .where(*in_range)
+            .order_by(RateSnapshot.recorded_at)
+            .limit(MAX_RAW_POINTS)
+        ).all()
+        return [
+            {
+                "at": at.replace(tzinfo=timezone.utc),
+                "rate": rate,
+                "min": rate,
+                "max": rate,
+                "samples": 1,
+            }
+            for at, rate in rows
+        ]
+
+    days = db.exec(
+        select(
+            RateSnapshot.day,
+            func.avg(RateSnapshot.rate),
+            func.min(RateSnapshot.rate),
+            func.max(RateSnapshot.rate),
+            func.count(),
+        )
+        .where(
+            *in_range,
+            # lets the (currency_code, day) index bound and order the groups
+            RateSnapshot.day.between(_naive_utc(start).date(), _naive_utc(end).date()),
+        )
+        .group_by(RateSnapshot.day)
+        .order_by(RateSnapshot.day)
+    ).all()
+    points = [
+        {"at": day, "rate": avg, "min": low, "max": high, "samples": n}
+        for day, avg, low, high, n in days
+    ]
+    if interval == "week":
+        points = _weekly(points)
+    for point in points:
+        point["at"] = datetime.combine(point["at"], time(), tzinfo=timezone.utc)
+    return points
+
+
+def _weekly(days: List[dict]) -> List[dict]:
+    weeks = {}
+    for point in days:
+        week = point["at"] - timedelta(days=point["at"].weekday())
+        current = weeks.get(week)
+        if current is None:
+            weeks[week] = {**point, "at": week}
+            continue
+        samples = current["samples"] + point["samples"]
+        current["rate"] = (
+            current["rate"] * current["samples"] + point["rate"] * point["samples"]
+        ) / samples
+        current["min"] = min(current["min"], point["min"])
+        current["max"] = max(current["max"], point["max"])
+        current["samples"] = samples
+    return list(weeks.values())
@@ -0,0 +1,78 @@
+"""Schema upgrades for country tables created by older releases
+
+``SQLModel.metadata.create_all`` creates missing tables but never touches
+existing ones, so columns and indexes added to ``Country`` (and indexes
+added to ``RateSnapshot``) later are created here. Runs at startup and is a no-op once they exist.
+"""
+
+import logging
+from typing import List
+from sqlalchemy import delete, inspect, text
+from sqlmodel import Session, func, select
+from .schema import Country, RateSnapshot
+
+
+logger = logging.getLogger(__name__)
+
+
+def drop_duplicate_countries(engine) -> int:
+    """Keep only the most recently refreshed row per country name."""
+    removed = 0
+    with Session(engine) as db:
+        names = db.exec(
+            select(Country.name).group_by(Country.name).having(func.count() > 1)
+        ).all()
+        for name in names:
+            ids = db.exec(
+                select(Country.id)
+                .where(Country.name == name)
+                .order_by(Country.last_refreshed_at.desc())
+            ).all()
+            db.exec(delete(Country).where(Country.id.in_(ids[1:])))
+            removed += len(ids) - 1
+        db.commit()
+    return removed
+
+
+def ensure_country_indexes(engine) -> List[str]:
+    """Create the ``Country`` indexes an existing table is missing.
+
+    The unique index on name cannot be built over duplicate names, which
+    the old per-row refresh could leave behind, so those are dropped first.
+    """
+    inspector = inspect(engine)
+    missing = []
+    for model in (Country, RateSnapshot):
+        if not inspector.has_table(model.__tablename__):
+            continue
+        existing = {i["name"] for i in inspector.get_indexes(model.__tablename__)}
+        missing += [i for i in model.__table__.indexes if i.name not in existing]
+
+    if any(index.unique for index in missing):
+        removed = drop_duplicate_countries(engine)
+        if removed:
+            logger.warning("Removed %d duplicate country rows", removed)
+    for index in missing:
+        index.create(engine)
+        logger.info("Created index %s", index.name)
+    return [index.name for index in missing]
+
+
+def ensure_country_columns(engine) -> List[str]:
+    """Add the nullable ``Country`` columns an existing table is missing."""
+    inspector = inspect(engine)
+    if not inspector.has_table(Country.__tablename__):
+        return []
+    existing = {c["name"] for c in inspector.get_columns(Country.__tablename__)}
+    missing = [c for c in Country.__table__.columns if c.name not in existing]
+    with engine.begin() as conn:
+        for column in missing:
+            column_type = column.type.compile(dialect=engine.dialect)
+            conn.execute(
+                text(
+                    f"ALTER TABLE {Country.__tablename__} "
+                    f"ADD COLUMN {column.name} {column_type}"
+                )
+            )
+            logger.info("Added column %s.%s", Country.__tablename__, column.name)
+    return [column.name for column in missing]
@@ -0,0 +1,205 @@
+"""Country ingestion in stages, on NumPy columns
+
+1. ``parse_columns`` turns the restcountries payload into one array per
+   field.
+2. ``validate`` and ``join_rates`` work on whole columns and
+   ``estimate_gdp`` draws every GDP multiplier in one call from a seedable
+   generator (``COUNTRY_GDP_SEED``), so a refresh can be reproduced.
+3. ``select_changes`` compares each row's ``content_hash``, a hash of its
+   upstream fields, with the stored one and only the new or changed rows
+   are materialised as ``Country`` objects.
+
+Unchanged rows keep their stored GDP instead of drawing a new multiplier.
+"""
+
+import hashlib
+import os
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+import numpy as np
+from .schema import Country
+
+
+GDP_SEED = os.getenv("COUNTRY_GDP_SEED")
+GDP_SEED = int(GDP_SEED) if GDP_SEED else None
+PER_CAPITA_RANGE = (1000.0, 2000.0)
+FINGERPRINT_COLUMNS = (
+    "name",
+    "capital",
+    "region",
+    "population",
+    "currency_code",
+    "exchange_rate",
+    "flag_url",
+)
+
+
+class CountryBatch:
+    """Refreshed countries as parallel columns, indexed like a list"""
+
+    def __init__(self, columns: Dict[str, np.ndarray], upstream_names=()):
+        self.columns = columns
+        # every name in the payload, including rows that failed validation
+        self.upstream_names = set(upstream_names)
+
+    def __len__(self) -> int:
+        return len(self.columns["name"])
+
+    def __getitem__(self, index: int) -> Country:
+        return self.materialise([index])[0]
+
+    def __iter__(self):
+        return iter(self.materialise(range(len(self))))
+
+    def materialise(self, indices) -> List[Country]:
+        """``Country`` objects for the rows at ``indices``."""
+        now = datetime.now(timezone.utc)
+        c = self.columns
+        countries = []
+        for i in indices:
+            rate, gdp = c["exchange_rate"][i], c["estimated_gdp"][i]
+            countries.append(
+                Country(
+                    name=c["name"][i],
+                    capital=c["capital"][i],
+                    region=c["region"][i],
+                    population=int(c["population"][i]),
+                    currency_code=c["currency_code"][i],
+                    exchange_rate=None if np.isnan(rate) else float(rate),
+                    estimated_gdp=None if np.isnan(gdp) else float(gdp),
+                    flag_url=c["flag_url"][i],
+                    content_hash=c["content_hash"][i],
+                    last_refreshed_at=now,
+                )
+            )
+        return countries
+
+    def top(self, n: int) -> List[int]:
+        """Indices of the ``n`` largest GDPs, missing GDP counting as 0."""
+        gdp = np.nan_to_num(self.columns["estimated_gdp"], nan=0.0)
+        n = min(n, len(gdp))
+        if n == 0:
+            return []
+        best = np.argpartition(-gdp, n - 1)[:n]
+        return best[np.argsort(-gdp[best], kind="stable")].tolist()
+
+
+def parse_columns(countries: list) -> Dict[str, np.ndarray]:
+    """Stage 1: one array per field of the restcountries payload."""
+    columns = {
+        "name": [c.get("name") for c in countries],
+        "capital": [c.get("capital") for c in countries],
+        "region": [c.get("region") for c in countries],
+        "flag_url": [c.get("flag") for c in countries],
+        "currency_code": [
+            (
+                (c["currencies"][0] or {}).get("code")
+                if isinstance(c.get("currencies"), list) and c["currencies"]
+                else None
+            )
+            for c in countries
+        ],
+    }
+    arrays = {k: np.array(v, dtype=object) for k, v in columns.items()}
+    populations = [c.get("population") for c in countries]
+    arrays["population"] = np.array(
+        [p if isinstance(p, int) else 0 for p in populations], dtype=np.int64
+    )
+    return arrays
+
+
+def validate(columns: Dict[str, np.ndarray]) -> Tuple[np.ndarray, List[dict]]:
+    """Stage 2: mask of valid rows and the errors of the others."""
+    has_name = columns["name"].astype(bool)
+    has_population = columns["population"] > 0
+    has_currency = columns["currency_code"].astype(bool)
+    valid = has_name & has_population & has_currency
+
+    error_log = []
+    for i in np.flatnonzero(~valid):
+        errors = {}
+        if not has_name[i]:
+            errors["name"] = "is required"
+        if not has_population[i]:
+            errors["population"] = "must be a positive integer"
+        if not has_currency[i]:
+            errors["currency_code"] = "is required"
+        name = columns["name"][i]
+        error_log.append({"country": name, "details": errors})
+        print({"error": "Validation failed", "details": errors, "country": name})
+    return valid, error_log
+
+
+def join_rates(currency_codes: np.ndarray, rates: dict) -> np.ndarray:
+    """Stage 2: exchange rate of each row, NaN where the currency has none."""
+    codes, inverse = np.unique(currency_codes.astype(str), return_inverse=True)
+    per_code = np.array([rates.get(code, np.nan) for code in codes], dtype=float)
+    return per_code[inverse]
+
+
+def estimate_gdp(
+    population: np.ndarray, exchange_rate: np.ndarray, rng: np.random.Generator
+) -> np.ndarray:
+    """Stage 2: population × random(1000–2000) ÷ exchange_rate.
+
+    NaN where the rate is missing or zero.
+    """
+    per_capita = rng.uniform(*PER_CAPITA_RANGE, size=len(population))
+    usable = np.isfinite(exchange_rate) & (exchange_rate != 0)
+    gdp = np.full(len(population), np.nan)
+    np.divide(population * per_capita, exchange_rate, out=gdp, where=usable)
+    return gdp
+
+
+def fingerprint(columns: Dict[str, np.ndarray]) -> np.ndarray:
+    """Stage 2: hash of each row's upstream fields."""
+    rows = zip(*(columns[c].tolist() for c in FINGERPRINT_COLUMNS))
+    digest = hashlib.blake2b
+    return np.array(
+        [digest(repr(row).encode(), digest_size=16).hexdigest() for row in rows],
+        dtype=object,
+    )
+
+
+def dedupe(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Keep the last row of each name, like a dict keyed by name would."""
+    names = columns["name"]
+    _, last = np.unique(names[::-1].astype(str), return_index=True)
+    if len(last) == len(names):
+        return columns
+    keep = np.sort(len(names) - 1 - last)
+    return {k: v[keep] for k, v in columns.items()}
+
+
+def build_batch(countries: list, rates: dict, seed=GDP_SEED) -> CountryBatch:
+    """Stages 1 and 2: parsed, validated countries with their GDP."""
+    columns = parse_columns(countries)
+    upstream_names = columns["name"].tolist()
+    valid, _ = validate(columns)
+    columns = dedupe({k: v[valid] for k, v in columns.items()})
+    columns["exchange_rate"] = join_rates(columns["currency_code"], rates)
+    columns["estimated_gdp"] = estimate_gdp(
+        columns["population"], columns["exchange_rate"], np.random.default_rng(seed)
+    )
+    columns["content_hash"] = fingerprint(columns)
+    return CountryBatch(columns, upstream_names)
+
+
+def select_changes(batch: CountryBatch, stored: Dict[str, dict]) -> List[Country]:
+    """Stage 3: ``Country`` objects for new rows and rows whose hash changed.
+
+    ``stored`` maps names to their stored ``content_hash`` and
+    ``estimated_gdp``. Unchanged rows get their stored GDP back in ``batch``.
+    """
+    c = batch.columns
+    rows = [stored.get(name) for name in c["name"]]
+    stored_hashes = np.array(
+        [row["content_hash"] if row else None for row in rows], dtype=object
+    )
+    changed = stored_hashes != c["content_hash"]
+
+    kept = np.flatnonzero(~changed)
+    c["estimated_gdp"][kept] = np.array(
+        [rows[i]["estimated_gdp"] for i in kept], dtype=float
+    )
+    return batch.materialise(np.flatnonzero(changed))
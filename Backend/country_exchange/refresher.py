@@ -0,0 +1,209 @@
+"""Country refresh, on demand and in the background
+
+``refresh_countries`` is the whole refresh: conditional fetch of both
+sources, upsert and image rendering. POST /countries/refresh runs it on
+request and ``CountryRefresher`` runs it every
+``COUNTRY_REFRESH_INTERVAL`` seconds (0, the default, disables it), delayed
+by up to ``COUNTRY_REFRESH_JITTER`` of the interval so several instances do
+not refresh in lockstep. A refresh commits in one transaction, so readers
+keep seeing the previous data until the new data is complete. Countries
+that disappear upstream are only deleted with ``COUNTRY_REFRESH_PRUNE`` or
+``?prune=true``.
+"""
+
+import asyncio
+import logging
+import os
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session, func, select
+from .cache import country_cache
+from .crud import delete_countries, stored_countries, upsert_countries
+from .fetch import country_data_async, http_cache
+from .history import record_rates
+from .pipeline import CountryBatch, select_changes
+from .schema import Country
+from .util import TOP_N, schedule_image
+
+
+REFRESH_INTERVAL = float(os.getenv("COUNTRY_REFRESH_INTERVAL", "0"))
+REFRESH_JITTER = float(os.getenv("COUNTRY_REFRESH_JITTER", "0.1"))
+REFRESH_PRUNE = os.getenv("COUNTRY_REFRESH_PRUNE", "false").lower() in ("1", "true")
+
+logger = logging.getLogger(__name__)
+
+# one refresh at a time, whether requested or scheduled
+refresh_lock = asyncio.Lock()
+
+
+def count_countries(db: Session) -> int:
+    return db.exec(select(func.count()).select_from(Country)).one()
+
+
+def forget_upstream():
+    """Make the next refresh fetch full bodies, after rows were deleted."""
+    http_cache.clear()
+
+
+def store_countries(
+    db: Session, countries: Optional[CountryBatch], prune: bool = False
+) -> dict:
+    """Write the new and changed countries and queue a redraw of the image.
+
+    ``countries`` is None when upstream reported no change, then only the
+    current total is read. Rows whose content hash is unchanged are not
+    written; with ``prune`` rows missing upstream are deleted in the same
+    transaction. Exchange rates that changed are appended to the rate
+    history either way.
+    """
+    if countries is None:
+        total_in_db = count_countries(db)
+        return {
+            "message": "Country data unchanged upstream",
+            "unchanged": total_in_db,
+            "updated": 0,
+            "inserted": 0,
+            "deleted": 0,
+            "total_in_db": total_in_db,
+        }
+
+    record_rates(db, countries, datetime.now(timezone.utc))
+    stored = stored_countries(db)
+    changed = select_changes(countries, stored)
+    vanished = stored.keys() - countries.upstream_names if prune else ()
+    deleted_count = delete_countries(db, vanished)
+    merged_countries, inserted_count, updated_count = upsert_countries(
+        db, changed, existing={name: row["id"] for name, row in stored.items()}
+    )
+    total_in_db = len(stored) + inserted_count - deleted_count
+
+    if changed or deleted_count:
+        country_cache.invalidate()
+        # the image needs the overall top countries, changed or not
+        by_name = {c.name: c for c in countries.materialise(countries.top(TOP_N))}
+        by_name.update((c.name, c) for c in merged_countries)
+        schedule_image(list(by_name.values()), total=total_in_db)
+
+    return {
+        "message": (
+            "Country data refreshed successfully"
+            if changed or deleted_count
+            else "Country data unchanged"
+        ),
+        "unchanged": len(countries) - len(changed),
+        "updated": updated_count,
+        "inserted": inserted_count,
+        "deleted": deleted_count,
+        "total_in_db": total_in_db,
+    }
+
+
+async def refresh_countries(
+    db: Session, force: bool = False, prune: bool = REFRESH_PRUNE
+) -> dict:
+    async with refresh_lock:
+        # a 304 cannot restore rows that are gone, so fill an empty table in full
+        force = force or not await run_in_threadpool(count_countries, db)
+        try:
+            countries = await country_data_async(cache=http_cache, force=force)
+            if countries is not None and not countries:
+                raise HTTPException(
+                    status_code=204, detail="No country data to refresh"
+                )
+            result = await run_in_threadpool(store_countries, db, countries, prune)
+        except BaseException:
+            http_cache.discard()
+            raise
+        await run_in_threadpool(http_cache.commit)
+        return result
+
+
+class CountryRefresher:
+    """Periodic ``refresh_countries`` on the app's event loop."""
+
+    def __init__(
+        self,
+        engine,
+        interval: float = REFRESH_INTERVAL,
+        jitter: float = REFRESH_JITTER,
+    ):
+        self.engine = engine
+        self.interval = interval
+        self.jitter = jitter
+        self.runs = 0
+        self.last_started_at: Optional[datetime] = None
+        self.last_finished_at: Optional[datetime] = None
+        self.last_result: Optional[dict] = None
+        self.last_error: Optional[str] = None
+        self.next_run_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    @property
+    def running(self) -> bool:
+        return self.last_started_at is not None and (
+            self.last_finished_at is None
+            or self.last_finished_at < self.last_started_at
+        )
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "interval_seconds": self.interval,
+            "running": self.running,
+            "runs": self.runs,
+            "last_started_at": self.last_started_at,
+            "last_finished_at": self.last_finished_at,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+            "next_run_at": self.next_run_at,
+        }
+
+    async def run_once(self):
+        """One refresh; failures are recorded, never raised."""
+        self.last_started_at = datetime.now(timezone.utc)
+        try:
+            with Session(self.engine) as db:
+                self.last_result = await refresh_countries(db)
+            self.last_error = None
+        except HTTPException as e:
+            self.last_error = str(e.detail)
+        except Exception as e:
+            logger.exception("Background country refresh failed")
+            self.last_error = repr(e)
+        finally:
+            self.runs += 1
+            self.last_finished_at = datetime.now(timezone.utc)
+
+    def _delay(self, first: bool) -> float:
+        spread = random.uniform(0, self.jitter * self.interval)
+        return spread if first else self.interval + spread
+
+    async def _loop(self):
+        first = True
+        while True:
+            delay = self._delay(first)
+            first = False
+            self.next_run_at = datetime.now(timezone.utc) + timedelta(seconds=delay)
+            await asyncio.sleep(delay)
+            self.next_run_at = None
+            await self.run_once()
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -1,8 +1,9 @@
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 from uuid import uuid4, UUID
 from typing import Optional, Any
 from pydantic import BaseModel
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 import random
 
 
@@ -19,15 +20,35 @@ class BaseSchema(BaseModel):
 
 class Country(SQLModel, table=True):
     id: UUID | None = Field(default_factory=uuid4, primary_key=True)
-    name: str
+    name: str = Field(unique=True, index=True)
     capital: Optional[str]
-    region: Optional[str]
+    region: Optional[str] = Field(index=True)
     population: int
-    currency_code: Optional[str] = None
+    currency_code: Optional[str] = Field(default=None, index=True)
     exchange_rate: Optional[float] = None
     estimated_gdp: Optional[float] = None
     flag_url: Optional[str]
     last_refreshed_at: datetime
+    # hash of the upstream fields, see pipeline.fingerprint
+    content_hash: Optional[str] = Field(default=None, max_length=32)
+
+
+class RateSnapshot(SQLModel, table=True):
+    """One observed exchange rate, appended on each refresh"""
+
+    __tablename__ = "rate_snapshot"
+    __table_args__ = (
+        Index("ix_rate_snapshot_currency_recorded", "currency_code", "recorded_at"),
+        Index("ix_rate_snapshot_currency_day", "currency_code", "day"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    currency_code: str = Field(max_length=8)
+    rate: float
+    recorded_at: datetime
+    # UTC day of recorded_at; daily and weekly rollups group on it through
+    # ix_rate_snapshot_currency_day
+    day: date
 
 
 class CountryResponse(BaseSchema):
@@ -56,9 +77,39 @@ class CountryResponseUUID(BaseSchema):
     last_refreshed_at: datetime
 
 
+class RefresherStatusOut(BaseSchema):
+    enabled: bool
+    interval_seconds: float
+    running: bool
+    runs: int
+    last_started_at: Optional[datetime] = None
+    last_finished_at: Optional[datetime] = None
+    last_result: Optional[dict] = None
+    last_error: Optional[str] = None
+    next_run_at: Optional[datetime] = None
+
+
+class RatePointOut(BaseSchema):
+    at: datetime
+    rate: float
+    min: float
+    max: float
+    samples: int
+
+
+class RateHistoryOut(BaseSchema):
+    name: str
+    currency_code: str
+    interval: str
+    start: datetime
+    end: datetime
+    points: list[RatePointOut]
+
+
 class SummaryOut(BaseSchema):
     total_countries: int
-    last_refreshed_at: datetime
+    last_refreshed_at: Optional[datetime] = None
+    background_refresh: Optional[RefresherStatusOut] = None
 
 
 # estimated_gdp — computed from population × random(1000–2000) ÷ exchange_rate
@@ -0,0 +1,550 @@
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
+from country_exchange.crud import upsert_countries
+from country_exchange.schema import Country, RateSnapshot
+
+
+def make_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'countries.db'}")
+    SQLModel.metadata.create_all(
+        engine, tables=[Country.__table__, RateSnapshot.__table__]
+    )
+    return engine
+
+
+def make_country(name, population=1000, region="Africa", currency_code="NGN"):
+    return Country(
+        name=name,
+        capital=f"{name} City",
+        region=region,
+        population=population,
+        currency_code=currency_code,
+        exchange_rate=2.0,
+        estimated_gdp=population * 1.5,
+        flag_url=None,
+        last_refreshed_at=datetime.now(timezone.utc),
+    )
+
+
+def count_statements(engine):
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda conn, cursor, stmt, *args: statements.append(stmt),
+    )
+    return statements
+
+
+def test_upsert_countries_uses_constant_queries(tmp_path):
+    engine = make_engine(tmp_path)
+    with Session(engine) as db:
+        upsert_countries(db, [make_country(f"C{i}") for i in range(50)])
+
+    statements = count_statements(engine)
+    refreshed = [make_country(f"C{i}", population=5) for i in range(25, 300)]
+    with Session(engine) as db:
+        merged, inserted, updated = upsert_countries(db, refreshed)
+
+    assert (inserted, updated) == (250, 25)
+    assert len(merged) == 275
+    # one SELECT, one INSERT and one UPDATE, each executemany
+    assert len(statements) == 3
+    with Session(engine) as db:
+        rows = db.exec(select(Country)).all()
+    assert len(rows) == 300
+    assert sum(r.population == 5 for r in rows) == 275
+
+
+def test_ensure_country_indexes_upgrades_old_table(tmp_path):
+    from sqlalchemy import Column, MetaData, Table, inspect, insert
+    from country_exchange.migrations import (
+        ensure_country_columns,
+        ensure_country_indexes,
+    )
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    old = Table(
+        "country",
+        MetaData(),
+        *[
+            Column(c.name, c.type, primary_key=c.primary_key)
+            for c in Country.__table__.columns
+            if c.name != "content_hash"
+        ],
+    )
+    old.create(engine)
+    rows = [make_country("Kenya"), make_country("Kenya"), make_country("Ghana")]
+    rows[1].last_refreshed_at = datetime(2099, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(old), [r.model_dump(exclude={"content_hash"}) for r in rows]
+        )
+
+    assert ensure_country_columns(engine) == ["content_hash"]
+    assert ensure_country_columns(engine) == []
+    created = ensure_country_indexes(engine)
+
+    assert sorted(created) == [
+        "ix_country_currency_code",
+        "ix_country_name",
+        "ix_country_region",
+    ]
+    assert ensure_country_indexes(engine) == []
+    with Session(engine) as db:
+        kenya = db.exec(select(Country).where(Country.name == "Kenya")).all()
+    assert [c.id for c in kenya] == [rows[1].id]
+    assert any(i["unique"] for i in inspect(engine).get_indexes("country"))
+
+
+def test_query_countries_filters_sorts_and_pages_in_sql(tmp_path):
+    from country_exchange.crud import query_countries
+
+    engine = make_engine(tmp_path)
+    countries = [
+        make_country("Nigeria", 200, "Africa", "NGN"),
+        make_country("Kenya", 50, "Africa", "KES"),
+        make_country("Ghana", 30, "Africa", "GHS"),
+        make_country("France", 60, "Europe", "EUR"),
+        make_country("100%_Land", 10, "Oceania", "XPF"),
+    ]
+    with Session(engine) as db:
+        upsert_countries(db, countries)
+
+    statements = count_statements(engine)
+    with Session(engine) as db:
+        page = query_countries(
+            db,
+            {"region": "AFR", "min_population": 40},
+            sort="gdp_desc",
+            limit=1,
+            offset=1,
+        )
+        assert [c["name"] for c in page] == ["Kenya"]
+        assert "id" not in page[0]
+        assert [c["name"] for c in query_countries(db, {"name": "%_"})] == ["100%_Land"]
+        assert [
+            c["name"] for c in query_countries(db, {"max_gdp": 75, "population": 30.0})
+        ] == ["Ghana"]
+        # zero means no filter, as the population/gdp/rate params always did
+        assert len(query_countries(db, {"population": 0, "exchange_rate": 0})) == 5
+    assert len(statements) == 4
+
+
+def start_stub_server(routes):
+    """Serve ``{path: (delay, status, body)}`` on a local port"""
+    import json
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            delay, status, body = routes[self.path]
+            if callable(body):
+                status, body = body(hits.count(self.path))
+            time.sleep(delay)
+            payload = json.dumps(body).encode()
+            etag = f'"{hash(payload)}"'
+            if status == 200 and self.headers.get("If-None-Match") == etag:
+                status, payload = 304, b""
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}", hits
+
+
+RESTCOUNTRIES = [
+    {
+        "name": "Nigeria",
+        "capital": "Abuja",
+        "region": "Africa",
+        "population": 200,
+        "flag": None,
+        "currencies": [{"code": "NGN"}],
+    },
+    {"name": "Nowhere", "population": 0, "currencies": []},
+]
+RATES = {"rates": {"NGN": 1500.0}}
+
+
+def test_country_data_fetches_sources_concurrently(monkeypatch):
+    import asyncio
+    import time
+    from country_exchange import fetch
+
+    server, base, _ = start_stub_server(
+        {"/countries": (0.4, 200, RESTCOUNTRIES), "/rates": (0.4, 200, RATES)}
+    )
+    monkeypatch.setattr(fetch, "COUNTRY_URL", f"{base}/countries")
+    monkeypatch.setattr(fetch, "RATE_URL", f"{base}/rates")
+
+    async def fetch_both():
+        async with fetch.new_client() as client:
+            return await fetch.country_data_async(client)
+
+    try:
+        start = time.perf_counter()
+        countries = asyncio.run(fetch_both())
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    assert [c.name for c in countries] == ["Nigeria"]
+    assert countries[0].exchange_rate == 1500.0
+    assert elapsed < 0.75
+
+
+def test_fetch_retries_transient_errors(monkeypatch):
+    import asyncio
+    import pytest
+    from fastapi import HTTPException
+    from country_exchange import fetch
+
+    flaky = lambda n: (503, {}) if n < 3 else (200, RATES)
+    server, base, hits = start_stub_server(
+        {"/rates": (0, 200, flaky), "/down": (0, 500, {})}
+    )
+    monkeypatch.setattr(fetch, "FETCH_BACKOFF", 0.01)
+    monkeypatch.setattr(fetch, "FETCH_RETRIES", 2)
+
+    async def get(path):
+        async with fetch.new_client() as client:
+            return await fetch.fetch_json(client, f"{base}{path}")
+
+    try:
+        assert asyncio.run(get("/rates")) == RATES
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(get("/down"))
+    finally:
+        server.shutdown()
+
+    assert exc.value.status_code == 503
+    assert hits == ["/rates"] * 3 + ["/down"] * 3
+
+
+def test_refresh_reuses_cached_bodies_on_304(tmp_path, monkeypatch):
+    import asyncio
+    from country_exchange import fetch
+
+    rates = dict(RATES)
+    server, base, hits = start_stub_server(
+        {"/countries": (0, 200, RESTCOUNTRIES), "/rates": (0, 200, rates)}
+    )
+    monkeypatch.setattr(fetch, "COUNTRY_URL", f"{base}/countries")
+    monkeypatch.setattr(fetch, "RATE_URL", f"{base}/rates")
+
+    async def refresh(cache, force=False, commit=True):
+        async with fetch.new_client() as client:
+            countries = await fetch.country_data_async(client, cache, force)
+        if commit:
+            cache.commit()
+        return countries
+
+    try:
+        # responses of a refresh that was not stored are not reused
+        asyncio.run(refresh(fetch.HTTPCache(str(tmp_path)), commit=False))
+        first = asyncio.run(refresh(fetch.HTTPCache(str(tmp_path))))
+        # a fresh HTTPCache only has what was persisted on disk
+        unchanged = asyncio.run(refresh(fetch.HTTPCache(str(tmp_path))))
+        forced = asyncio.run(refresh(fetch.HTTPCache(str(tmp_path)), force=True))
+        rates["rates"] = {"NGN": 750.0}
+        changed = asyncio.run(refresh(fetch.HTTPCache(str(tmp_path))))
+    finally:
+        server.shutdown()
+
+    assert [c.exchange_rate for c in first] == [1500.0]
+    assert unchanged is None
+    assert [c.name for c in forced] == ["Nigeria"]
+    assert [c.exchange_rate for c in changed] == [750.0]
+    assert len(hits) == 10
+
+
+def test_background_refresher_runs_on_schedule(tmp_path, monkeypatch):
+    import asyncio
+    from country_exchange import fetch, refresher, util
+
+    server, base, hits = start_stub_server(
+        {"/countries": (0, 200, RESTCOUNTRIES), "/rates": (0, 200, RATES)}
+    )
+    monkeypatch.setattr(util, "IMAGE_PATH", tmp_path / "summary.png")
+    monkeypatch.setattr(util, "_image", dict.fromkeys(util._image))
+    monkeypatch.setattr(fetch, "COUNTRY_URL", f"{base}/countries")
+    monkeypatch.setattr(fetch, "RATE_URL", f"{base}/rates")
+    monkeypatch.setattr(refresher, "http_cache", fetch.HTTPCache(str(tmp_path)))
+    engine = make_engine(tmp_path)
+    background = refresher.CountryRefresher(engine, interval=0.3, jitter=0.2)
+
+    async def run():
+        async with fetch.new_client() as client:
+            monkeypatch.setattr(fetch, "_client", client)
+            background.start()
+            await asyncio.sleep(0.5)
+            await background.stop()
+
+    try:
+        asyncio.run(run())
+    finally:
+        server.shutdown()
+        util._render_executor.submit(lambda: None).result()
+
+    status = background.status()
+    assert status["runs"] == 2
+    assert status["last_error"] is None
+    assert status["last_result"]["message"] == "Country data unchanged upstream"
+    assert not status["running"]
+    with Session(engine) as db:
+        assert [c.name for c in db.exec(select(Country))] == ["Nigeria"]
+
+
+def test_summary_image_is_redrawn_only_when_inputs_change(tmp_path, monkeypatch):
+    from country_exchange import util
+
+    monkeypatch.setattr(util, "IMAGE_PATH", tmp_path / "cache" / "summary.png")
+    monkeypatch.setattr(util, "_image", dict.fromkeys(util._image))
+    countries = [make_country(f"C{i}", population=i + 1) for i in range(10)]
+
+    first = util.schedule_image(countries, total=12).result()
+    png, etag = util.current_image()
+    again = util.generate_image(list(reversed(countries)), total=12)
+
+    assert first["changed"] and not again["changed"]
+    assert first["top5"] == ["C9", "C8", "C7", "C6", "C5"]
+    assert util.IMAGE_PATH.read_bytes() == png
+    assert util.current_image() == (png, etag)
+
+    # after a restart the fingerprint is read back from the PNG
+    monkeypatch.setattr(util, "_image", dict.fromkeys(util._image))
+    assert not util.generate_image(countries, total=12)["changed"]
+    assert util.generate_image(countries, total=13)["changed"]
+    assert util.current_image()[1] != etag
+
+    # another worker rendering the file replaces the copy served from memory
+    other = util.render_summary(util.summary_inputs(countries, 14), "other")
+    util.write_atomic(util.IMAGE_PATH, other)
+    assert util.current_image()[0] == other
+    assert util.generate_image(countries, total=13)["changed"]
+
+
+def test_read_cache_serves_hits_until_invalidated(tmp_path):
+    from country_exchange.cache import MemoryBackend, NullBackend, ReadCache
+    from country_exchange.crud import country_summary, get_country_row
+
+    engine = make_engine(tmp_path)
+    cache = ReadCache(MemoryBackend(maxsize=16, ttl=60))
+    with Session(engine) as db:
+        upsert_countries(db, [make_country("Nigeria")])
+        statements = count_statements(engine)
+
+        assert (
+            cache.get_or_load("status", {}, lambda: country_summary(db))[
+                "total_countries"
+            ]
+            == 1
+        )
+        assert cache.get_or_load("country", {"name": "Ghana"}, lambda: None) is None
+        assert (
+            cache.get_or_load("status", {}, lambda: country_summary(db))[
+                "total_countries"
+            ]
+            == 1
+        )
+        assert cache.get_or_load("country", {"name": "Ghana"}, lambda: 1 / 0) is None
+        assert len(statements) == 1
+
+        upsert_countries(db, [make_country("Ghana")])
+        cache.invalidate()
+        assert get_country_row(db, "Ghana")["name"] == "Ghana"
+        assert (
+            cache.get_or_load(
+                "country", {"name": "Ghana"}, lambda: get_country_row(db, "Ghana")
+            )["population"]
+            == 1000
+        )
+        assert (
+            cache.get_or_load("status", {}, lambda: country_summary(db))[
+                "total_countries"
+            ]
+            == 2
+        )
+
+    uncached = ReadCache(NullBackend())
+    loads = []
+    for _ in range(2):
+        uncached.get_or_load("status", {}, lambda: loads.append(1))
+    assert len(loads) == 2
+
+
+def test_pipeline_is_reproducible_and_writes_only_changed_rows(tmp_path, monkeypatch):
+    from country_exchange import refresher, util
+    from country_exchange.crud import stored_countries
+    from country_exchange.pipeline import build_batch, select_changes
+
+    monkeypatch.setattr(util, "IMAGE_PATH", tmp_path / "summary.png")
+    monkeypatch.setattr(util, "_image", dict.fromkeys(util._image))
+    payload = [
+        {"name": "Nigeria", "population": 200, "currencies": [{"code": "NGN"}]},
+        {"name": "Ghana", "population": 30, "currencies": [{"code": "GHS"}]},
+        {"name": "Nowhere", "population": 0, "currencies": []},
+        {"name": "Zeroland", "population": 5, "currencies": [{"code": "ZER"}]},
+    ]
+    rates = {"NGN": 1500.0, "GHS": 12.0, "ZER": 0}
+
+    first = build_batch(payload, rates, seed=7)
+    again = build_batch(payload, rates, seed=7)
+    assert list(first.columns["name"]) == ["Nigeria", "Ghana", "Zeroland"]
+    assert list(first.columns["estimated_gdp"][:2]) == list(
+        again.columns["estimated_gdp"][:2]
+    )
+    assert [c.estimated_gdp for c in first][2] is None
+    assert first.top(2) == [1, 0]
+
+    engine = make_engine(tmp_path)
+    with Session(engine) as db:
+        assert refresher.store_countries(db, first)["inserted"] == 3
+        stored = {c.name: c.estimated_gdp for c in db.exec(select(Country))}
+
+        rates["GHS"] = 6.0
+        batch = build_batch(payload, rates, seed=8)
+        changed = select_changes(batch, stored_countries(db))
+        assert [c.name for c in changed] == ["Ghana"]
+        assert batch[0].estimated_gdp == stored["Nigeria"]
+
+        result = refresher.store_countries(db, build_batch(payload, rates, seed=8))
+        assert (result["inserted"], result["updated"]) == (0, 1)
+        result = refresher.store_countries(db, build_batch(payload, rates, seed=9))
+        assert result["message"] == "Country data unchanged"
+        assert result["unchanged"] == 3
+
+        # Nowhere fails validation but is still listed, so it is kept
+        db.add(make_country("Nowhere"))
+        db.commit()
+        del payload[1]
+        result = refresher.store_countries(db, build_batch(payload, rates), prune=False)
+        assert (result["deleted"], result["total_in_db"]) == (0, 4)
+        result = refresher.store_countries(db, build_batch(payload, rates), prune=True)
+        assert (result["unchanged"], result["deleted"], result["total_in_db"]) == (
+            2,
+            1,
+            3,
+        )
+        assert "Ghana" not in {c.name for c in db.exec(select(Country))}
+    util._render_executor.submit(lambda: None).result()
+
+
+def test_rate_history_ranges_and_downsampling(tmp_path):
+    import pytest
+    from datetime import timedelta
+    from fastapi import HTTPException
+    from country_exchange.history import rate_history, record_rates
+    from country_exchange.pipeline import build_batch
+
+    engine = make_engine(tmp_path)
+    payload = [
+        {"name": "Nigeria", "population": 200, "currencies": [{"code": "NGN"}]},
+        {"name": "Ghana", "population": 30, "currencies": [{"code": "GHS"}]},
+        {"name": "Togo", "population": 8, "currencies": [{"code": "XOF"}]},
+    ]
+    # Monday 2025-01-06 to Tuesday 2025-01-14, two refreshes a day
+    monday = datetime(2025, 1, 6, tzinfo=timezone.utc)
+    with Session(engine) as db:
+        recorded = []
+        for day in range(9):
+            for hour, rate in ((6, 1000.0 + day), (18, 1100.0 + day)):
+                batch = build_batch(payload, {"NGN": rate, "GHS": 12.0}, seed=0)
+                at = monday + timedelta(days=day, hours=hour)
+                recorded.append(record_rates(db, batch, at))
+        # a rate equal to the latest one, as on a forced refresh, is skipped
+        assert record_rates(db, batch, at + timedelta(hours=1)) == 0
+        db.commit()
+        assert recorded == [2] + [1] * 17
+
+        raw = rate_history(db, "NGN", monday, monday + timedelta(days=1), "raw")
+        daily = rate_history(db, "NGN", monday, monday + timedelta(days=30), "day")
+        weekly = rate_history(db, "NGN", monday, monday + timedelta(days=30), "week")
+        with pytest.raises(HTTPException):
+            rate_history(db, "NGN", monday, monday, "month")
+
+    assert [(p["at"].hour, p["rate"]) for p in raw] == [(6, 1000.0), (18, 1100.0)]
+    assert len(daily) == 9
+    assert (daily[0]["rate"], daily[0]["min"], daily[0]["max"]) == (
+        1050.0,
+        1000.0,
+        1100.0,
+    )
+    assert [(p["at"].date().isoformat(), p["samples"]) for p in weekly] == [
+        ("2025-01-06", 14),
+        ("2025-01-13", 4),
+    ]
+    assert weekly[0]["rate"] == pytest.approx(1053.0)
+    assert (weekly[1]["min"], weekly[1]["max"]) == (1007.0, 1108.0)
+
+
+def test_refresh_after_flush_or_failure_fetches_in_full(tmp_path, monkeypatch):
+    import asyncio
+    import pytest
+    from sqlalchemy import delete
+    from country_exchange import fetch, refresher, util
+
+    countries = list(RESTCOUNTRIES)
+    server, base, hits = start_stub_server(
+        {"/countries": (0, 200, countries), "/rates": (0, 200, RATES)}
+    )
+    monkeypatch.setattr(util, "IMAGE_PATH", tmp_path / "summary.png")
+    monkeypatch.setattr(util, "_image", dict.fromkeys(util._image))
+    monkeypatch.setattr(fetch, "COUNTRY_URL", f"{base}/countries")
+    monkeypatch.setattr(fetch, "RATE_URL", f"{base}/rates")
+    monkeypatch.setattr(refresher, "http_cache", fetch.HTTPCache(str(tmp_path)))
+    engine = make_engine(tmp_path)
+
+    def flush(db):
+        db.exec(delete(Country))
+        db.commit()
+
+    async def run():
+        results = []
+        async with fetch.new_client() as client:
+            monkeypatch.setattr(fetch, "_client", client)
+            with Session(engine) as db:
+                results.append(await refresher.refresh_countries(db))
+                results.append(await refresher.refresh_countries(db))
+                # what DELETE /countries/flush does
+                flush(db)
+                refresher.forget_upstream()
+                results.append(await refresher.refresh_countries(db))
+                # an empty table is filled in full even with the validators kept
+                flush(db)
+                results.append(await refresher.refresh_countries(db))
+
+                # a new body whose refresh fails is fetched again next time
+                countries.append({**RESTCOUNTRIES[0], "name": "Ghana"})
+                store = refresher.store_countries
+                monkeypatch.setattr(refresher, "store_countries", lambda *a: 1 / 0)
+                with pytest.raises(ZeroDivisionError):
+                    await refresher.refresh_countries(db)
+                monkeypatch.setattr(refresher, "store_countries", store)
+                results.append(await refresher.refresh_countries(db))
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        server.shutdown()
+        util._render_executor.submit(lambda: None).result()
+
+    assert [r["inserted"] for r in results] == [1, 0, 1, 1, 1]
+    assert results[1]["message"] == "Country data unchanged upstream"
+    assert results[-1]["total_in_db"] == 2
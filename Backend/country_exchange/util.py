@@ -3,33 +3,80 @@ Total number of countries
 Top 5 countries by estimated GDP
 Timestamp of last refresh
 Save the generated image on disk at cache/summary.png
+
+The inputs are reduced to a fingerprint first and the PNG is only redrawn
+when that changes. Rendering runs on a single worker thread, the file is
+replaced atomically and the latest PNG is kept in memory with its ETag for
+GET /countries/image. The in-memory copy is checked against the file's
+inode, mtime and size on every read, so an image another worker or machine
+rendered is picked up. The fingerprint is stored in the PNG itself so a
+restart does not force a redraw.
 """
 
-from sqlmodel import Session, select
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import List, Optional, Tuple
 from .schema import Country
+import hashlib
+import heapq
+import json
 import os
+import tempfile
+import threading
 from datetime import datetime
 
 
-def generate_image(db: Session):
-    """Generate a summary image from database refresh results."""
-    countries = db.exec(select(Country)).all()
-    sorted_countries = sorted(
-        countries,
-        key=lambda c: (getattr(c, "estimated_gdp", 0) or 0),
-        reverse=True,
-    )
-    top5 = sorted_countries[:5]
-    total = len(countries)
+CACHE_DIR = Path(__file__).parent.parent / "cache"
+IMAGE_PATH = CACHE_DIR / "summary.png"
+TOP_N = 5
+
+_render_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summary")
+_image_lock = threading.Lock()
+_image = {"fingerprint": None, "png": None, "etag": None, "stamp": None}
+
+
+@lru_cache(maxsize=None)
+def load_fonts():
+    """Header, regular and small fonts, read from disk once."""
+    from PIL import ImageFont
 
-    # fallback if Pillow not installed
     try:
-        from PIL import Image, ImageDraw, ImageFont
+        return (
+            ImageFont.truetype("DejaVuSans-Bold.ttf", 22),
+            ImageFont.truetype("DejaVuSans.ttf", 18),
+            ImageFont.truetype("DejaVuSans.ttf", 14),
+        )
     except Exception:
-        return {
-            "total": total,
-            "top5": [getattr(c, "name", None) for c in top5],
-        }
+        default = ImageFont.load_default()
+        return default, default, default
+
+
+def summary_inputs(countries: List[Country], total: Optional[int] = None) -> dict:
+    """Everything the image shows, as plain values."""
+    top = heapq.nlargest(
+        TOP_N, countries, key=lambda c: getattr(c, "estimated_gdp", 0) or 0
+    )
+    refreshed = [c.last_refreshed_at for c in countries if c.last_refreshed_at]
+    last_refreshed_at = max(refreshed) if refreshed else datetime.now()
+    return {
+        "total": len(countries) if total is None else total,
+        "top": [(c.name, c.estimated_gdp) for c in top],
+        "last_refreshed_at": str(last_refreshed_at),
+    }
+
+
+def fingerprint(inputs: dict) -> str:
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def render_summary(inputs: dict, key: str = "") -> bytes:
+    """PNG bytes of the summary image."""
+    from PIL import Image, ImageDraw
+    from PIL.PngImagePlugin import PngInfo
+
+    top5 = inputs["top"]
 
     # Layout configuration
     width = 800
@@ -40,15 +87,7 @@ def generate_image(db: Session):
 
     img = Image.new("RGB", (width, height), color="#FFFFFF")
     draw = ImageDraw.Draw(img)
-
-    try:
-        header_font = ImageFont.truetype("DejaVuSans-Bold.ttf", 22)
-        regular_font = ImageFont.truetype("DejaVuSans.ttf", 18)
-        small_font = ImageFont.truetype("DejaVuSans.ttf", 14)
-    except Exception:
-        header_font = ImageFont.load_default()
-        regular_font = ImageFont.load_default()
-        small_font = ImageFont.load_default()
+    header_font, regular_font, small_font = load_fonts()
 
     # HEADER section
     header_text = "🌍 Country GDP Summary"
@@ -62,7 +101,10 @@ def generate_image(db: Session):
     # BODY section
     y = top_margin
     draw.text(
-        (40, y), f"Total countries in DB: {total}", fill="black", font=regular_font
+        (40, y),
+        f"Total countries in DB: {inputs['total']}",
+        fill="black",
+        font=regular_font,
     )
     y += 40
     draw.text(
@@ -76,15 +118,12 @@ def generate_image(db: Session):
     y += 40
 
     # DATA rows
-    for idx, c in enumerate(top5, start=1):
-        gdp = getattr(c, "estimated_gdp", None)
+    for idx, (country_name, gdp) in enumerate(top5, start=1):
         if isinstance(gdp, (int, float)):
             gdp_str = f"${gdp:,.2f}"  # ✅ added dollar sign
         else:
             gdp_str = "N/A"
 
-        country_name = getattr(c, "name", "N/A")
-
         # draw left: country, right: GDP value
         draw.text((60, y), f"{idx}. {country_name}", fill="black", font=regular_font)
         text_width = draw.textlength(gdp_str, font=regular_font)
@@ -97,25 +136,100 @@ def generate_image(db: Session):
     y += 40
 
     # FOOTER section
-    last_refreshed_at = (
-        getattr(countries[0], "last_refreshed_at", None)
-        if countries
-        else datetime.now().isoformat()
-    )
     draw.text(
         (40, y),
-        f"Last refreshed: {last_refreshed_at}",
+        f"Last refreshed: {inputs['last_refreshed_at']}",
         fill="#555555",
         font=small_font,
     )
 
-    # Save the image
-    os.makedirs("cache", exist_ok=True)
-    output_path = "cache/summary.png"
-    img.save(output_path)
+    info = PngInfo()
+    info.add_text("fingerprint", key)
+    out = BytesIO()
+    img.save(out, format="PNG", pnginfo=info)
+    return out.getvalue()
 
-    return {
-        "total": total,
-        "top5": [getattr(c, "name", None) for c in top5],
-        "image_path": output_path,
+
+def _stamp(stat: os.stat_result) -> tuple:
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def write_atomic(path: Path, data: bytes) -> tuple:
+    """Replace ``path`` with ``data``, returns the stamp of the new file."""
+    os.makedirs(path.parent, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        stamp = _stamp(os.stat(tmp_path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return stamp
+
+
+def _remember(png: bytes, key: Optional[str], stamp: Optional[tuple]):
+    _image.update(
+        fingerprint=key,
+        png=png,
+        etag=f'"{hashlib.sha256(png).hexdigest()[:32]}"',
+        stamp=stamp,
+    )
+
+
+def current_image() -> Tuple[Optional[bytes], Optional[str]]:
+    """Latest PNG and its ETag, re-read when the file on disk changed."""
+    with _image_lock:
+        try:
+            stamp = _stamp(IMAGE_PATH.stat())
+        except FileNotFoundError:
+            stamp = None
+        if stamp is not None and stamp != _image["stamp"]:
+            png = IMAGE_PATH.read_bytes()
+            key = None
+            try:
+                from PIL import Image
+
+                key = Image.open(BytesIO(png)).info.get("fingerprint")
+            except Exception:
+                pass
+            _remember(png, key, stamp)
+        return _image["png"], _image["etag"]
+
+
+def generate_image(countries: List[Country], total: Optional[int] = None):
+    """Generate a summary image from the countries of a refresh.
+
+    ``total`` is the number of countries in the database, when it differs
+    from the refreshed set. Nothing is drawn if the inputs are unchanged.
+    """
+    inputs = summary_inputs(countries, total)
+    summary = {
+        "total": inputs["total"],
+        "top5": [name for name, _ in inputs["top"]],
     }
+
+    # fallback if Pillow not installed
+    try:
+        import PIL  # noqa: F401
+    except Exception:
+        return summary
+
+    key = fingerprint(inputs)
+    current_image()
+    with _image_lock:
+        if _image["fingerprint"] == key:
+            return {**summary, "image_path": str(IMAGE_PATH), "changed": False}
+
+    png = render_summary(inputs, key)
+    with _image_lock:
+        _remember(png, key, write_atomic(IMAGE_PATH, png))
+
+    return {**summary, "image_path": str(IMAGE_PATH), "changed": True}
+
+
+def schedule_image(countries: List[Country], total: Optional[int] = None) -> Future:
+    """Render on the image worker thread, off the refresh request."""
+    return _render_executor.submit(generate_image, list(countries), total)
@@ -1,27 +1,37 @@
 """Main Entry Point"""
 
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from medFinder.main import app as medfinder
 from AISummarizationExtraction.app import app as ai_documents_app
 from AISummarizationExtraction import models as ai_document_models
 from WalletService.app import app as paystack_apikeys_app
 from WalletService.user.models import Base as WalletBase
-from myprofile.utils import get_cat_fact
+from myprofile.utils import fact_pool, get_cat_fact
 from myprofile.schema import Profile, get_profile
+from string_analyzers.query import compile_query
+from string_analyzers.string_analyzer import shutdown_analysis_pool
 from string_analyzers.schema import (
     StringAnalyzerCreate,
     StringAnalyzerOut,
     FilterDataOut,
     NaturalLanguageFilteringOut,
     InterpretedQuery,
+    StringBatchOut,
+    StringStatsOut,
+    corpus_stats,
     save_to_db,
+    save_many_to_db,
+    read_batch_values,
+    stream_ndjson,
     search_db_for_data,
     del_from_db,
     filter_by_given_params,
-    detect_filter_params,
+    filter_by_query_plan,
+    parse_fields,
 )
 from typing import Optional
 from db import engine, get_session
@@ -31,19 +41,31 @@ from country_exchange.schema import (
     Country,
     CountryResponse,
     CountryResponseUUID,
+    RateHistoryOut,
     SummaryOut,
 )
-from country_exchange.fetch import country_data
-from country_exchange.util import generate_image
-from datetime import timezone, datetime
-from pathlib import Path
+from country_exchange.cache import country_cache
+from country_exchange.crud import (
+    country_summary,
+    get_country_row,
+    normalise_filters,
+    query_countries,
+)
+from country_exchange.fetch import close_http_client
+from country_exchange.history import as_utc, rate_history
+from country_exchange.migrations import ensure_country_columns, ensure_country_indexes
+from country_exchange.refresher import (
+    REFRESH_PRUNE,
+    CountryRefresher,
+    forget_upstream,
+    refresh_countries,
+)
+from country_exchange.util import current_image
+from datetime import timedelta, timezone, datetime
 import logging
 import sys
-import os
 
 
-BASE_DIR = Path(__file__).parent
-
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
@@ -54,13 +76,24 @@ logger = logging.getLogger(__name__)
 logger.propagate = True
 
 
+country_refresher = CountryRefresher(engine)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("Starting up: creating database tables...")
     SQLModel.metadata.create_all(engine, checkfirst=True)
+    ensure_country_columns(engine)
+    ensure_country_indexes(engine)
     WalletBase.metadata.create_all(engine, checkfirst=True)
+    country_refresher.start()
+    fact_pool.start()
 
     yield
+    await fact_pool.stop()
+    await country_refresher.stop()
+    await close_http_client()
+    await run_in_threadpool(shutdown_analysis_pool)
     print("Shutting down...")
 
 
@@ -124,7 +157,8 @@ def me(profile: Profile = Depends(get_profile)):
 def nlfiltering(query: str):
     print(f"[DEBUG] Query received: {query}", flush=True)
 
-    response = detect_filter_params(query)
+    plan = compile_query(query)
+    response = plan.as_params()
     logger.info(f"NLP Filter Response: {response}")
     print(f"[DEBUG] Parsed response: {response}", flush=True)
 
@@ -143,14 +177,7 @@ def nlfiltering(query: str):
             detail="Query parsed but resulted in conflicting filters",
         )
 
-    results, filters_applied = filter_by_given_params(
-        is_palindrome=response.get("is_palindrome"),
-        min_length=response.get("min_length"),
-        max_length=response.get("max_length"),
-        word_count=response.get("word_count"),
-        contains_character=response.get("contains_character"),
-    )
-    data = [r["value"] for r in results]
+    data, filters_applied = filter_by_query_plan(plan)
     count = len(data)
 
     interpreted_query = InterpretedQuery(original=query, parsed_filters=filters_applied)
@@ -163,14 +190,35 @@ def nlfiltering(query: str):
     return nlf_data
 
 
+@app.get(
+    "/strings/stats", status_code=status.HTTP_200_OK, response_model=StringStatsOut
+)
+def string_stats():
+    """Histograms, palindrome ratio and character totals of the corpus"""
+    return corpus_stats()
+
+
 @app.get(
     "/strings/{string_value}",
     status_code=status.HTTP_200_OK,
     response_model=StringAnalyzerOut,
 )
-def get_string(string_value):
-    """get string data"""
-    return search_db_for_data(string_value)
+def get_string(
+    string_value,
+    fields: Optional[str] = Query(
+        None, description="Comma separated fields to return, e.g. id,value,length"
+    ),
+):
+    """get string data
+
+    With ``fields`` only those are loaded and returned, so the
+    character_frequency_map is skipped unless it is asked for.
+    """
+    projection = parse_fields(fields)
+    record = search_db_for_data(string_value, projection)
+    if projection is not None:
+        return JSONResponse(record)
+    return record
 
 
 @app.post(
@@ -185,15 +233,45 @@ def post_string(request: StringAnalyzerCreate):
     return save_to_db(request.value)
 
 
+@app.post(
+    "/strings/batch", status_code=status.HTTP_200_OK, response_model=StringBatchOut
+)
+async def post_strings_batch(request: Request):
+    """post many strings as a JSON array or application/x-ndjson"""
+    values = await read_batch_values(request)
+    return await run_in_threadpool(save_many_to_db, values)
+
+
 @app.get("/strings", status_code=status.HTTP_200_OK, response_model=FilterDataOut)
 def filter_string(
+    request: Request,
     is_palindrome: Optional[bool] = None,
     min_length: Optional[int] = Query(None, ge=0),
     max_length: Optional[int] = Query(None, ge=0),
     word_count: Optional[int] = None,
     contains_character: Optional[str] = Query(None, max_length=1, min_length=1),
+    contains: Optional[str] = Query(
+        None, min_length=1, description="Case-insensitive substring"
+    ),
+    limit: Optional[int] = Query(None, ge=1, description="Page size"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the last page"),
+    format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+    fields: Optional[str] = Query(
+        None, description="Comma separated fields to return, e.g. id,value,length"
+    ),
 ):
-    """filter string"""
+    """filter string
+
+    Pass ``limit`` to page through results and feed ``next_cursor`` back as
+    ``cursor``. ``format=ndjson`` (or ``Accept: application/x-ndjson``)
+    streams one record per line instead of building the whole page; when
+    more records follow, the last line is ``{"next_cursor": ...}``.
+    ``fields`` trims each record to the named fields.
+    """
+    projection = parse_fields(fields)
+    ndjson = format == "ndjson" or (
+        format is None and "application/x-ndjson" in request.headers.get("accept", "")
+    )
 
     results, filters_applied = filter_by_given_params(
         is_palindrome=is_palindrome,
@@ -201,12 +279,34 @@ def filter_string(
         max_length=max_length,
         word_count=word_count,
         contains_character=contains_character,
+        contains=contains,
+        cursor=cursor,
+        limit=None if limit is None else limit + 1,
+        fields=projection,
     )
 
+    if ndjson:
+        return StreamingResponse(
+            stream_ndjson(results, limit), media_type="application/x-ndjson"
+        )
+
     data = list(results)
+    next_cursor = None
+    if limit is not None and len(data) > limit:
+        data = data[:limit]
+        next_cursor = data[-1]["id"]
     count = len(data)
 
-    return {"data": data, "count": count, "filters_applied": filters_applied}
+    response = {
+        "data": data,
+        "count": count,
+        "filters_applied": filters_applied,
+        "next_cursor": next_cursor,
+    }
+    if projection is not None:
+        # partial records do not fit FilterDataOut
+        return JSONResponse(response)
+    return response
 
 
 @app.delete("/strings/{string_value}", status_code=status.HTTP_204_NO_CONTENT)
@@ -216,19 +316,17 @@ def delete_string(request: StringAnalyzerCreate):
 
 
 @app.get("/countries/image", status_code=status.HTTP_200_OK)
-def get_image_summary():
-    cache_dir = BASE_DIR / "cache"
-    file_path = cache_dir / "summary.png"
-
-    print(f"Looking for file at: {file_path}", flush=True)
-    if cache_dir.exists():
-        print(f"cache dir contents: {list(cache_dir.iterdir())}", flush=True)
-    if not os.path.exists(file_path):
+def get_image_summary(request: Request):
+    """Summary PNG, served from memory with an ETag"""
+    png, etag = current_image()
+    if png is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"No image found"
         )
-    print(f"Returning file: {file_path}, exists: {file_path.exists()}", flush=True)
-    return FileResponse(str(file_path), media_type="image/png")
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=png, media_type="image/png", headers=headers)
 
 
 @app.delete("/countries/flush")
@@ -239,57 +337,20 @@ def flush_countries(db: Session = Depends(get_session)):
 
     db.exec(delete(Country))
     db.commit()
+    country_cache.invalidate()
+    forget_upstream()
     return {"message": f"Deleted {total} countries from database."}
 
 
 @app.post("/countries/refresh", status_code=status.HTTP_200_OK)
-def refresh_country_data_in_db(db: Session = Depends(get_session)):
-    countries = country_data()
-
-    if not countries:
-        raise HTTPException(status_code=204, detail="No country data to refresh")
-
-    updated_count = 0
-    inserted_count = 0
-    merged_countries = []
-
-    for new_country in countries:
-        existing = db.exec(
-            select(Country).where(Country.name == new_country.name)
-        ).first()
-
-        if existing:
-            existing.capital = new_country.capital
-            existing.region = new_country.region
-            existing.population = new_country.population
-            existing.currency_code = new_country.currency_code
-            existing.exchange_rate = new_country.exchange_rate
-            existing.estimated_gdp = new_country.estimated_gdp
-            existing.flag_url = new_country.flag_url
-            existing.last_refreshed_at = datetime.now(timezone.utc)
-            updated_count += 1
-            merged_countries.append(existing)
-        else:
-            new_country.last_refreshed_at = datetime.now(timezone.utc)
-            db.add(new_country)
-            inserted_count += 1
-            merged_countries.append(new_country)
-
-    db.commit()
-
-    for c in merged_countries:
-        db.refresh(c)
-
-    generate_image(db)
-
-    total_in_db = db.exec(select(func.count()).select_from(Country)).one()
-
-    return {
-        "message": "Country data refreshed successfully",
-        "updated": updated_count,
-        "inserted": inserted_count,
-        "total_in_db": total_in_db,
-    }
+async def refresh_country_data_in_db(
+    force: bool = Query(False, description="Ignore cached upstream responses"),
+    prune: bool = Query(
+        REFRESH_PRUNE, description="Delete countries no longer listed upstream"
+    ),
+    db: Session = Depends(get_session),
+):
+    return await refresh_countries(db, force=force, prune=prune)
 
 
 @app.get(
@@ -305,6 +366,17 @@ def get_countries(
     population: Optional[float] = Query(None, description="Filter by population"),
     estimated_gdp: Optional[float] = Query(None, description="Filter by estimated GDP"),
     exchange_rate: Optional[float] = Query(None, description="Filter by exchange rate"),
+    min_population: Optional[int] = Query(None, ge=0),
+    max_population: Optional[int] = Query(None, ge=0),
+    min_gdp: Optional[float] = Query(None),
+    max_gdp: Optional[float] = Query(None),
+    min_exchange_rate: Optional[float] = Query(None),
+    max_exchange_rate: Optional[float] = Query(None),
+    sort: Optional[str] = Query(
+        None, description="e.g. gdp_desc, population_asc, -name (default name)"
+    ),
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
     db: Session = Depends(get_session),
 ):
     """
@@ -313,47 +385,42 @@ def get_countries(
       /countries?region=Africa
       /countries?name=Kenya
       /countries?currency_code=USD
+      /countries?region=Africa&min_population=1000000&sort=gdp_desc&limit=10
     """
+    filters = {
+        "name": name,
+        "region": region,
+        "capital": capital,
+        "currency_code": currency_code,
+        "population": population,
+        "estimated_gdp": estimated_gdp,
+        "exchange_rate": exchange_rate,
+        "min_population": min_population,
+        "max_population": max_population,
+        "min_gdp": min_gdp,
+        "max_gdp": max_gdp,
+        "min_exchange_rate": min_exchange_rate,
+        "max_exchange_rate": max_exchange_rate,
+    }
+    params = {
+        **normalise_filters(filters),
+        "sort": sort,
+        "limit": limit,
+        "offset": offset,
+    }
+    countries = country_cache.get_or_load(
+        "countries",
+        params,
+        lambda: query_countries(db, filters, sort=sort, limit=limit, offset=offset),
+    )
 
-    countries = db.exec(select(Country)).all()
-
-    def match(country):
-        if name and name.lower() not in (country.name or "").lower():
-            return False
-        if region and region.lower() not in (country.region or "").lower():
-            return False
-        if capital and capital.lower() not in (country.capital or "").lower():
-            return False
-        if (
-            currency_code
-            and currency_code.lower() not in (country.currency_code or "").lower()
-        ):
-            return False
-        if population and country.population != population:
-            return False
-        if estimated_gdp and country.estimated_gdp != estimated_gdp:
-            return False
-        if exchange_rate and country.exchange_rate != exchange_rate:
-            return False
-        return True
-
-    filtered = [c for c in countries if match(c)]
-
-    if not filtered:
+    if not countries:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="No countries found matching search criteria.",
         )
 
-    response = [
-        CountryResponse(
-            id=i + 1,
-            **{k: getattr(c, k) for k in Country.__fields__ if k != "id"},
-        )
-        for i, c in enumerate(filtered)
-    ]
-
-    return response
+    return [{"id": offset + i + 1, **country} for i, country in enumerate(countries)]
 
 
 @app.get(
@@ -363,7 +430,9 @@ def get_countries(
 )
 def get_country_by_name(name: str, db: Session = Depends(get_session)):
     """Get country by name"""
-    country = db.exec(select(Country).where(Country.name == name)).first()
+    country = country_cache.get_or_load(
+        "country", {"name": name}, lambda: get_country_row(db, name)
+    )
     if not country:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"{name} not found"
@@ -372,6 +441,48 @@ def get_country_by_name(name: str, db: Session = Depends(get_session)):
     return country
 
 
+@app.get(
+    "/countries/{name}/rates",
+    status_code=status.HTTP_200_OK,
+    response_model=RateHistoryOut,
+)
+def get_country_rates(
+    name: str,
+    start: Optional[datetime] = Query(
+        None, alias="from", description="Start of the range, default 30 days ago"
+    ),
+    end: Optional[datetime] = Query(
+        None, alias="to", description="End of the range, default now"
+    ),
+    interval: str = Query("raw", description="raw, day or week"),
+    db: Session = Depends(get_session),
+):
+    """Recorded exchange rates of a country's currency"""
+    country = country_cache.get_or_load(
+        "country", {"name": name}, lambda: get_country_row(db, name)
+    )
+    if not country or not country["currency_code"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail=f"{name} not found"
+        )
+
+    end = as_utc(end) if end else datetime.now(timezone.utc)
+    start = as_utc(start) if start else end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="'from' must not be after 'to'",
+        )
+    return {
+        "name": country["name"],
+        "currency_code": country["currency_code"],
+        "interval": interval,
+        "start": start,
+        "end": end,
+        "points": rate_history(db, country["currency_code"], start, end, interval),
+    }
+
+
 @app.delete("/countries/{name}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_country_by_name(name: str, db: Session = Depends(get_session)):
     """country by name"""
@@ -383,18 +494,13 @@ def delete_country_by_name(name: str, db: Session = Depends(get_session)):
         )
     db.delete(country)
     db.commit()
+    country_cache.invalidate()
+    forget_upstream()
     return
 
 
 @app.get("/status", status_code=status.HTTP_200_OK, response_model=SummaryOut)
 def get_status(db: Session = Depends(get_session)):
     """Get db status"""
-    countries = db.exec(select(Country)).all()
-    if countries:
-        latest_country = max(countries, key=lambda c: c.last_refreshed_at)
-        last_refreshed_at = latest_country.last_refreshed_at
-
-    else:
-        last_refreshed_at = None
-
-    return {"total_countries": len(countries), "last_refreshed_at": last_refreshed_at}
+    summary = country_cache.get_or_load("status", {}, lambda: country_summary(db))
+    return {**summary, "background_refresh": country_refresher.status()}
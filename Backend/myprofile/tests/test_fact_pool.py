@@ -0,0 +1,54 @@
+import asyncio
+import json
+import httpx
+from myprofile import utils
+from myprofile.utils import FactPool
+
+
+def fact_client(facts):
+    hits = []
+
+    def handler(request):
+        hits.append(request.url.path)
+        if not facts:
+            return httpx.Response(503)
+        fact = facts.pop(0)
+        return httpx.Response(200, json={"fact": fact, "length": len(fact)})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), hits
+
+
+def test_fact_pool_serves_from_buffer_and_persists_in_batches(tmp_path, monkeypatch):
+    path = tmp_path / "cache.json"
+    path.write_text(json.dumps([{"fact": "old", "length": 3}]))
+    monkeypatch.setattr(utils, "PERSIST_BATCH", 3)
+    monkeypatch.setattr(utils, "REFILL_BATCH", 2)
+    client, hits = fact_client(["a", "b", "old", "c"])
+    pool = FactPool(str(path), size=4, client=client)
+
+    assert asyncio.run(pool.refill()) == 2
+    # only two new facts so far, below the batch size
+    assert [f["fact"] for f in json.loads(path.read_text())] == ["old"]
+    assert asyncio.run(pool.refill()) == 2
+    assert [f["fact"] for f in json.loads(path.read_text())] == ["old", "a", "b", "c"]
+    assert len(hits) == 4
+    assert asyncio.run(pool.refill()) == 0 and len(hits) == 4
+
+    assert [pool.take()["fact"] for _ in range(4)] == ["a", "b", "old", "c"]
+    # an empty buffer falls back to the history instead of waiting
+    assert pool.take()["fact"] in {"old", "a", "b", "c"}
+
+
+def test_get_cat_fact_without_any_facts(tmp_path, monkeypatch):
+    client, _ = fact_client([])
+    pool = FactPool(str(tmp_path / "cache.json"), size=2, client=client)
+    monkeypatch.setattr(utils, "fact_pool", pool)
+
+    assert asyncio.run(pool.refill()) == 0
+    result = utils.get_cat_fact()
+    assert result["cached"] is False and "503" in result["error"]
+
+    pool.add({"fact": "cats nap", "length": 8})
+    assert utils.get_cat_fact() == "cats nap"
+    asyncio.run(pool.stop())
+    assert json.loads((tmp_path / "cache.json").read_text())[0]["fact"] == "cats nap"
@@ -1,38 +1,176 @@
-"""Utility functions"""
+"""Utility functions
 
+Cat facts are served from ``FactPool``, an in-memory ring buffer of fresh
+facts that a background task refills from catfact.ninja with one shared
+``httpx.AsyncClient``. ``/fact`` and ``/me`` never wait on the upstream:
+when the buffer is empty a fact seen before is served instead. Facts not
+seen before are added to ``cache.json`` in batches, not on every request.
+"""
+
+import asyncio
 import json
-import requests
+import logging
 import os
 import random
+import tempfile
+import threading
+from collections import deque
+from typing import List, Optional
+import httpx
 
 
 CACHE_FILE = "cache.json"
+FACT_URL = os.getenv("CAT_FACT_URL", "https://catfact.ninja/fact")
+POOL_SIZE = int(os.getenv("CAT_FACT_POOL_SIZE", "32"))
+REFILL_INTERVAL = float(os.getenv("CAT_FACT_REFILL_INTERVAL", "5"))
+REFILL_BATCH = int(os.getenv("CAT_FACT_REFILL_BATCH", "8"))
+PERSIST_BATCH = int(os.getenv("CAT_FACT_PERSIST_BATCH", "10"))
+FETCH_TIMEOUT = 5
+
+logger = logging.getLogger(__name__)
+
+
+class FactPool:
+    """Ring buffer of unserved cat facts plus the history of all facts seen"""
+
+    def __init__(
+        self,
+        path: str = CACHE_FILE,
+        size: int = POOL_SIZE,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        self.path = path
+        self.size = size
+        self._fresh = deque(maxlen=size)
+        self._history: List[dict] = []
+        self._known = set()
+        self._pending: List[dict] = []
+        self._lock = threading.Lock()
+        self._client = client
+        self._task: Optional[asyncio.Task] = None
+        self._loaded = False
+        self.last_error: Optional[str] = None
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, "r") as f:
+                facts = json.load(f)
+        except (OSError, ValueError):
+            facts = []
+        for data in facts:
+            if data.get("fact") and data["fact"] not in self._known:
+                self._known.add(data["fact"])
+                self._history.append(data)
+
+    def add(self, data: dict) -> bool:
+        """Buffer a fetched fact; returns whether it is new to the history."""
+        fact = data.get("fact")
+        if not fact:
+            return False
+        with self._lock:
+            self._load()
+            self._fresh.append(data)
+            if fact in self._known:
+                return False
+            self._known.add(fact)
+            self._history.append(data)
+            self._pending.append(data)
+            return True
+
+    def take(self) -> Optional[dict]:
+        """A fresh fact, else a random one from the history, never blocking."""
+        with self._lock:
+            self._load()
+            if self._fresh:
+                return self._fresh.popleft()
+            if self._history:
+                return random.choice(self._history)
+            return None
+
+    def missing(self) -> int:
+        with self._lock:
+            return self.size - len(self._fresh)
+
+    def persist(self, force: bool = False) -> int:
+        """Write the history once ``PERSIST_BATCH`` new facts are pending."""
+        with self._lock:
+            if not self._pending or (len(self._pending) < PERSIST_BATCH and not force):
+                return 0
+            written, history = len(self._pending), list(self._history)
+            self._pending = []
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(history, f, indent=2)
+        os.replace(tmp_path, self.path)
+        return written
+
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=FETCH_TIMEOUT)
+        return self._client
+
+    async def _fetch(self) -> Optional[dict]:
+        try:
+            response = await self.client().get(FACT_URL)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            self.last_error = f"Error fetching cat fact: {e}"
+            return None
+
+    async def refill(self) -> int:
+        """Fetch up to ``REFILL_BATCH`` missing facts concurrently.
+
+        Returns how many facts were buffered.
+        """
+        wanted = min(self.missing(), REFILL_BATCH)
+        if wanted <= 0:
+            return 0
+        results = await asyncio.gather(*(self._fetch() for _ in range(wanted)))
+        fetched = [data for data in results if data and data.get("fact")]
+        for data in fetched:
+            self.add(data)
+        if fetched:
+            self.last_error = None
+        await asyncio.to_thread(self.persist)
+        return len(fetched)
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.refill()
+            except Exception:
+                logger.exception("Cat fact refill failed")
+            await asyncio.sleep(REFILL_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self.persist(force=True)
+
+
+fact_pool = FactPool()
 
 
 def get_cat_fact():
-    try:
-        response = requests.get("https://catfact.ninja/fact", timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        fact = data["fact"]
-
-        cached_facts = []
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, "r") as f:
-                cached_facts = json.load(f)
-
-        if fact and fact not in cached_facts:
-            cached_facts.append(data)
-            with open(CACHE_FILE, "w") as f:
-                json.dump(cached_facts, f, indent=2)
-
-        return data.get("fact", "No fact found.")
-    except requests.RequestException as e:
-        random_fact = None
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, "r") as f:
-                cached_facts = json.load(f)
-                if cached_facts:
-                    random_fact = random.choice(cached_facts)["fact"]
-                return {"cached": True, "data": random_fact}
-        return {"cached": False, "error": f"Error fetching cat fact: {e}"}
+    data = fact_pool.take()
+    if data is None:
+        error = fact_pool.last_error or "No cat fact fetched yet"
+        return {"cached": False, "error": error}
+    return data.get("fact", "No fact found.")
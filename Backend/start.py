@@ -3,5 +3,7 @@ import os
 from uvicorn import run
 from main import app
 
-port = int(os.environ.get("PORT", 80))
-run(app, host="0.0.0.0", port=port)
+# worker processes re-import this module, they must not start a server
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 80))
+    run(app, host="0.0.0.0", port=port)
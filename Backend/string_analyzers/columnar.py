@@ -0,0 +1,270 @@
+"""Columnar binary snapshot for the string analyzer corpus
+
+``DB.json`` repeats the id as ``sha256_hash``, pretty-prints every
+``character_frequency_map`` and has to be parsed into Python objects in
+full. The columnar layout stores each property once, as fixed-width
+columns sorted by id, with the values in one UTF-8 heap:
+
+    header      magic, count, heap sizes
+    ids         32-byte sha256 digests, sorted
+    length, word_count, unique_characters   int64 columns
+    is_palindrome                           uint8 column
+    value heap, created_at heap             UTF-8 bytes
+    value / created_at offsets              uint64, count + 1 each
+    totals      JSON character totals for /strings/stats
+
+The file is memory mapped, records are decoded only when they are read and
+``character_frequency_map`` is rebuilt from the value on demand instead of
+being stored.
+
+Conversion:
+    python -m string_analyzers.columnar to-columnar DB.json DB.strcol
+    python -m string_analyzers.columnar to-json DB.strcol DB.json
+"""
+
+import json
+import mmap
+import struct
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, Optional
+
+
+MAGIC = b"STRCOL01"
+HEADER = struct.Struct("<8sQQQQ")
+ID_SIZE = 32
+
+
+def _pad(size: int) -> int:
+    return (size + 7) & ~7
+
+
+def write_columnar(f, records: Iterable[dict]):
+    """Write records to the open binary file ``f`` in the columnar layout."""
+    rows = sorted(records, key=lambda r: r["id"])
+    count = len(rows)
+
+    ids = b"".join(bytes.fromhex(r["id"]) for r in rows)
+    lengths = array("q", (r["properties"]["length"] for r in rows))
+    word_counts = array("q", (r["properties"]["word_count"] for r in rows))
+    uniques = array("q", (r["properties"]["unique_characters"] for r in rows))
+    palindromes = bytes(bool(r["properties"]["is_palindrome"]) for r in rows)
+
+    f.write(b"\0" * HEADER.size)
+    for column in (ids, lengths.tobytes(), word_counts.tobytes(), uniques.tobytes()):
+        f.write(column)
+    f.write(palindromes + b"\0" * (_pad(count) - count))
+
+    characters: Counter = Counter()
+    heaps = []
+    for field in ("value", "created_at"):
+        offsets = array("Q", [0])
+        size = 0
+        for r in rows:
+            data = r[field].encode("utf-8")
+            f.write(data)
+            size += len(data)
+            offsets.append(size)
+            if field == "value":
+                characters.update(r["properties"]["character_frequency_map"])
+        f.write(b"\0" * (_pad(size) - size))
+        heaps.append((size, offsets))
+
+    for _, offsets in heaps:
+        f.write(offsets.tobytes())
+    totals = json.dumps({"characters": characters}).encode("utf-8")
+    f.write(totals)
+
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, count, heaps[0][0], heaps[1][0], len(totals)))
+
+
+class ColumnarSnapshot:
+    """Read-only, memory-mapped view of a columnar snapshot file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mm)
+        magic, count, value_size, created_size, totals_size = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a columnar string snapshot")
+        self.count = count
+
+        pos = HEADER.size
+        self._ids = view[pos : pos + ID_SIZE * count]
+        pos += ID_SIZE * count
+        columns = []
+        for _ in range(3):
+            columns.append(view[pos : pos + 8 * count].cast("q"))
+            pos += 8 * count
+        self.lengths, self.word_counts, self.uniques = columns
+        self.palindromes = view[pos : pos + count]
+        pos += _pad(count)
+        self._values = view[pos : pos + value_size]
+        pos += _pad(value_size)
+        self._created = view[pos : pos + created_size]
+        pos += _pad(created_size)
+        self._value_offsets = view[pos : pos + 8 * (count + 1)].cast("Q")
+        pos += 8 * (count + 1)
+        self._created_offsets = view[pos : pos + 8 * (count + 1)].cast("Q")
+        pos += 8 * (count + 1)
+        self._totals = bytes(view[pos : pos + totals_size])
+
+    def __len__(self) -> int:
+        return self.count
+
+    def id_at(self, row: int) -> str:
+        return self._ids[row * ID_SIZE : (row + 1) * ID_SIZE].hex()
+
+    def find(self, data_id: str) -> Optional[int]:
+        """Row of ``data_id``, by binary search over the sorted digests."""
+        try:
+            digest = bytes.fromhex(data_id)
+        except ValueError:
+            return None
+        if len(digest) != ID_SIZE:
+            return None
+        ids = self._ids
+        row = bisect_left(
+            range(self.count),
+            digest,
+            key=lambda i: ids[i * ID_SIZE : (i + 1) * ID_SIZE].tobytes(),
+        )
+        if row < self.count and ids[row * ID_SIZE : (row + 1) * ID_SIZE] == digest:
+            return row
+        return None
+
+    def value_at(self, row: int) -> str:
+        start, end = self._value_offsets[row], self._value_offsets[row + 1]
+        return str(self._values[start:end], "utf-8")
+
+    def summary_record(self, row: int) -> dict:
+        """Record without ``character_frequency_map``, enough for indexing."""
+        return {
+            "id": self.id_at(row),
+            "value": self.value_at(row),
+            "properties": {
+                "length": self.lengths[row],
+                "is_palindrome": bool(self.palindromes[row]),
+                "word_count": self.word_counts[row],
+            },
+        }
+
+    def record(self, row: int, frequency_map: bool = True) -> dict:
+        """Decode one row; the frequency map is only counted when asked for."""
+        value = self.value_at(row)
+        start, end = self._created_offsets[row], self._created_offsets[row + 1]
+        data_id = self.id_at(row)
+        properties = {
+            "length": self.lengths[row],
+            "is_palindrome": bool(self.palindromes[row]),
+            "unique_characters": self.uniques[row],
+            "word_count": self.word_counts[row],
+            "sha256_hash": data_id,
+        }
+        if frequency_map:
+            properties["character_frequency_map"] = dict(Counter(value))
+        return {
+            "id": data_id,
+            "value": value,
+            "properties": properties,
+            "created_at": str(self._created[start:end], "utf-8"),
+        }
+
+    def character_totals(self) -> Dict[str, int]:
+        return json.loads(self._totals)["characters"]
+
+
+class SnapshotRecords(MutableMapping):
+    """id -> record mapping over a snapshot, with changes kept in memory."""
+
+    def __init__(self, snapshot: ColumnarSnapshot):
+        self.snapshot = snapshot
+        self._changed: Dict[str, dict] = {}
+        self._deleted = set()
+        self._size = len(snapshot)
+
+    def _row(self, data_id: str) -> Optional[int]:
+        if data_id in self._deleted:
+            return None
+        return self.snapshot.find(data_id)
+
+    def __getitem__(self, data_id: str) -> dict:
+        if data_id in self._changed:
+            return self._changed[data_id]
+        row = self._row(data_id)
+        if row is None:
+            raise KeyError(data_id)
+        return self.snapshot.record(row)
+
+    def lookup(self, data_id: str, frequency_map: bool = True) -> Optional[dict]:
+        if data_id in self._changed:
+            return self._changed[data_id]
+        row = self._row(data_id)
+        if row is None:
+            return None
+        return self.snapshot.record(row, frequency_map)
+
+    def __contains__(self, data_id) -> bool:
+        return data_id in self._changed or self._row(data_id) is not None
+
+    def __setitem__(self, data_id: str, record: dict):
+        if data_id not in self:
+            self._size += 1
+        self._changed[data_id] = record
+
+    def __delitem__(self, data_id: str):
+        if data_id not in self:
+            raise KeyError(data_id)
+        self._changed.pop(data_id, None)
+        if self.snapshot.find(data_id) is not None:
+            self._deleted.add(data_id)
+        self._size -= 1
+
+    def __iter__(self) -> Iterator[str]:
+        for row in range(len(self.snapshot)):
+            data_id = self.snapshot.id_at(row)
+            if data_id not in self._deleted and data_id not in self._changed:
+                yield data_id
+        yield from list(self._changed)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def summaries(self) -> Iterator[dict]:
+        """Every current record, snapshot rows as ``summary_record``."""
+        snapshot = self.snapshot
+        for row in range(len(snapshot)):
+            data_id = snapshot.id_at(row)
+            if data_id not in self._deleted and data_id not in self._changed:
+                yield snapshot.summary_record(row)
+        yield from list(self._changed.values())
+
+
+def read_columnar(path: str) -> Dict[str, dict]:
+    snapshot = ColumnarSnapshot(path)
+    return {r["id"]: r for r in map(snapshot.record, range(len(snapshot)))}
+
+
+if __name__ == "__main__":
+    import argparse
+    from string_analyzers.storage import read_json_db, write_json_db
+
+    parser = argparse.ArgumentParser(description="Convert string snapshots")
+    parser.add_argument("action", choices=["to-columnar", "to-json"])
+    parser.add_argument("source")
+    parser.add_argument("target")
+    args = parser.parse_args()
+
+    if args.action == "to-columnar":
+        records = read_json_db(args.source)
+        with open(args.target, "wb") as f:
+            write_columnar(f, records.values())
+    else:
+        records = read_columnar(args.source)
+        write_json_db(args.target, records)
+    print(f"Wrote {len(records)} records to {args.target}")
@@ -0,0 +1,180 @@
+"""Secondary indexes for the string analyzer store
+
+Every filter of GET /strings has a posting structure here:
+
+- length: one id set per length plus a sorted list of the lengths in use,
+  so ``min_length``/``max_length`` is a bisect over distinct lengths
+- is_palindrome: one id set per boolean
+- word_count: one id set per count
+- contains_character: one id set per lowercased character
+- contains (substring): one id set per lowercased trigram; values longer
+  than ``STRING_TRIGRAM_MAX_LENGTH`` are not split into trigrams and are
+  always kept as candidates instead
+
+A query starts from the smallest candidate set and checks the remaining
+filters against it, so the cost follows the result size. Substring
+candidates still have to be verified against the value by the caller.
+"""
+
+import os
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, List, Optional, Set
+
+
+TRIGRAM_MAX_LENGTH = int(os.getenv("STRING_TRIGRAM_MAX_LENGTH", "10000"))
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class StringIndex:
+    """In-memory postings for stored string records."""
+
+    def __init__(self):
+        self._ids: Set[str] = set()
+        self._length_of: Dict[str, int] = {}
+        self._by_length: Dict[int, Set[str]] = {}
+        self._lengths: List[int] = []
+        self._by_palindrome: Dict[bool, Set[str]] = {True: set(), False: set()}
+        self._by_word_count: Dict[int, Set[str]] = {}
+        self._by_char: Dict[str, Set[str]] = {}
+        self._by_trigram: Dict[str, Set[str]] = {}
+        self._untrigrammed: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, record: dict):
+        data_id = record["id"]
+        if data_id in self._ids:
+            self.remove(record)
+        props = record["properties"]
+        length = props["length"]
+
+        self._ids.add(data_id)
+        self._length_of[data_id] = length
+        if length not in self._by_length:
+            self._by_length[length] = set()
+            insort(self._lengths, length)
+        self._by_length[length].add(data_id)
+        self._by_palindrome[bool(props["is_palindrome"])].add(data_id)
+        self._by_word_count.setdefault(props["word_count"], set()).add(data_id)
+        lowered = record["value"].lower()
+        for char in set(lowered):
+            self._by_char.setdefault(char, set()).add(data_id)
+        if len(lowered) > TRIGRAM_MAX_LENGTH:
+            self._untrigrammed.add(data_id)
+        else:
+            for gram in trigrams(lowered):
+                self._by_trigram.setdefault(gram, set()).add(data_id)
+
+    def remove(self, record: dict):
+        data_id = record["id"]
+        if data_id not in self._ids:
+            return
+        props = record["properties"]
+        length = self._length_of.pop(data_id)
+
+        self._ids.discard(data_id)
+        _discard(self._by_length, length, data_id)
+        if length not in self._by_length:
+            del self._lengths[bisect_left(self._lengths, length)]
+        self._by_palindrome[bool(props["is_palindrome"])].discard(data_id)
+        _discard(self._by_word_count, props["word_count"], data_id)
+        lowered = record["value"].lower()
+        for char in set(lowered):
+            _discard(self._by_char, char, data_id)
+        if len(lowered) > TRIGRAM_MAX_LENGTH:
+            self._untrigrammed.discard(data_id)
+        else:
+            for gram in trigrams(lowered):
+                _discard(self._by_trigram, gram, data_id)
+
+    def _substring_candidates(self, needle: str) -> Set[str]:
+        if not needle:
+            return set(self._ids)
+        if len(needle) < 3:
+            grams = [self._by_char.get(char, set()) for char in set(needle)]
+        else:
+            grams = [self._by_trigram.get(g, set()) for g in trigrams(needle)]
+        grams.sort(key=len)
+        result = set(grams[0])
+        for posting in grams[1:]:
+            if not result:
+                break
+            result &= posting
+        if len(needle) >= 3:
+            result |= self._untrigrammed
+        return result
+
+    def _length_range(self, min_length: Optional[int], max_length: Optional[int]):
+        lo = 0 if min_length is None else bisect_left(self._lengths, min_length)
+        hi = (
+            len(self._lengths)
+            if max_length is None
+            else bisect_right(self._lengths, max_length)
+        )
+        return [self._by_length[n] for n in self._lengths[lo:hi]]
+
+    def query(
+        self,
+        is_palindrome: Optional[bool] = None,
+        min_length: Optional[int] = None,
+        max_length: Optional[int] = None,
+        word_count: Optional[int] = None,
+        contains_character: Optional[str] = None,
+        contains: Optional[str] = None,
+    ) -> Set[str]:
+        """Ids matching every given filter.
+
+        For ``contains`` (and a multi-character ``contains_character``) the
+        result is a candidate set that still needs a substring check.
+        """
+        postings: List[Set[str]] = []
+        if is_palindrome is not None:
+            postings.append(self._by_palindrome[bool(is_palindrome)])
+        if word_count is not None:
+            postings.append(self._by_word_count.get(word_count, set()))
+        if contains_character is not None:
+            for char in set(contains_character.lower()):
+                postings.append(self._by_char.get(char, set()))
+        if contains is not None:
+            postings.append(self._substring_candidates(contains.lower()))
+
+        ranged = min_length is not None or max_length is not None
+        if ranged:
+            buckets = self._length_range(min_length, max_length)
+            range_size = sum(len(b) for b in buckets)
+
+        if not postings:
+            if not ranged:
+                return set(self._ids)
+            return set().union(*buckets)
+
+        postings.sort(key=len)
+        if ranged and range_size < len(postings[0]):
+            result = set().union(*buckets)
+            for posting in postings:
+                result &= posting
+            return result
+
+        result = set(postings[0])
+        for posting in postings[1:]:
+            if not result:
+                break
+            result &= posting
+        if ranged and result:
+            lo = 0 if min_length is None else min_length
+            hi = self._lengths[-1] if max_length is None else max_length
+            result = {i for i in result if lo <= self._length_of[i] <= hi}
+        return result
+
+
+def _discard(postings: Dict, key, data_id: str):
+    ids = postings.get(key)
+    if ids is None:
+        return
+    ids.discard(data_id)
+    if not ids:
+        del postings[key]
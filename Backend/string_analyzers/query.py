@@ -0,0 +1,149 @@
+"""Natural language query compiler for /strings/filter-by-natural-language
+
+A query is scanned once by a single combined pattern and turned into an
+immutable ``FilterPlan``. Plans are cached by normalised query text, and the
+values a plan matches are cached per store version so repeated dashboard
+queries skip both parsing and filtering until the store changes.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Optional, Tuple
+
+
+PLAN_CACHE_SIZE = int(os.getenv("STRING_NL_PLAN_CACHE_SIZE", "1024"))
+RESULT_CACHE_SIZE = int(os.getenv("STRING_NL_RESULT_CACHE_SIZE", "256"))
+
+NUMBER_WORDS = {
+    "single": 1,
+    "one": 1,
+    "two": 2,
+    "three": 3,
+    "four": 4,
+    "five": 5,
+    "six": 6,
+    "seven": 7,
+    "eight": 8,
+    "nine": 9,
+    "ten": 10,
+}
+
+# Every alternative sits inside a lookahead so overlapping phrases are all
+# seen, the same as searching for each one separately.
+TOKEN_PATTERN = re.compile(
+    r"(?=(?:"
+    r"(?P<palindrome>palindrom(?:e|ic))"
+    r"|\b(?P<word_name>" + "|".join(NUMBER_WORDS) + r")\s+word"
+    r"|(?P<word_num>\d+)\s+word"
+    r"|(?:longer|more)\s+than\s+(?P<min>\d+)"
+    r"|(?:shorter|less)\s+than\s+(?P<max>\d+)"
+    r"|(?:letter|character)\s+(?P<char>[a-z])"
+    r"|(?:containing|contains|with)\s+(?P<alt_char>[a-z])\b"
+    r"|(?:containing|contains|with)\s+(?:the\s+)?(?:substring\s+|text\s+)?"
+    r"(?P<quote>['\"])(?P<substring>.+?)(?P=quote)"
+    r"|first\s(?P<first>vowel|consonant)"
+    r"))"
+)
+
+
+QUOTED_PATTERN = re.compile(r"(['\"]).+?\1")
+WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass(frozen=True)
+class FilterPlan:
+    """Typed filters parsed from a natural language query."""
+
+    word_count: Optional[int] = None
+    is_palindrome: Optional[bool] = None
+    contains_character: Optional[str] = None
+    min_length: Optional[int] = None
+    max_length: Optional[int] = None
+    contains: Optional[str] = None
+
+    def as_params(self) -> dict:
+        return asdict(self)
+
+    def filters(self) -> dict:
+        return {k: v for k, v in asdict(self).items() if v is not None}
+
+
+def normalise_query(text: str) -> str:
+    """Lowercase and collapse whitespace, keeping it as is in quoted text."""
+    parts, pos = [], 0
+    for match in QUOTED_PATTERN.finditer(text):
+        parts.append(WHITESPACE.sub(" ", text[pos : match.start()]))
+        parts.append(match.group())
+        pos = match.end()
+    parts.append(WHITESPACE.sub(" ", text[pos:]))
+    return "".join(parts).lower().strip()
+
+
+def compile_query(text: str) -> FilterPlan:
+    """Parse a natural language query, cached by its normalised text."""
+    return _compile_normalised(normalise_query(text))
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def _compile_normalised(text: str) -> FilterPlan:
+    found = {}
+    for match in TOKEN_PATTERN.finditer(text):
+        kind = match.lastgroup
+        # first (leftmost) hit of each kind wins
+        if kind is not None and kind not in found:
+            found[kind] = match.group(kind)
+
+    word_count = None
+    if "word_name" in found:
+        word_count = NUMBER_WORDS[found["word_name"]]
+    elif "word_num" in found:
+        word_count = int(found["word_num"])
+
+    contains_character = found.get("char") or found.get("alt_char")
+    if contains_character is None and "first" in found:
+        contains_character = "a" if found["first"] == "vowel" else "b"
+
+    return FilterPlan(
+        word_count=word_count,
+        is_palindrome=True if "palindrome" in found else None,
+        contains_character=contains_character,
+        min_length=int(found["min"]) + 1 if "min" in found else None,
+        max_length=int(found["max"]) - 1 if "max" in found else None,
+        contains=found.get("substring"),
+    )
+
+
+class ResultCache:
+    """Matching values per plan, dropped whenever the store version moves."""
+
+    def __init__(self, maxsize: int = RESULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.version = None
+        self._entries: "OrderedDict[FilterPlan, Tuple[str, ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, plan: FilterPlan, version) -> Optional[Tuple[str, ...]]:
+        with self._lock:
+            if version is None or version != self.version:
+                self._entries.clear()
+                self.version = version
+                return None
+            values = self._entries.get(plan)
+            if values is not None:
+                self._entries.move_to_end(plan)
+            return values
+
+    def put(self, plan: FilterPlan, version, values: Tuple[str, ...]):
+        with self._lock:
+            if not self.maxsize or version is None or version != self.version:
+                return
+            self._entries[plan] = values
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+result_cache = ResultCache()
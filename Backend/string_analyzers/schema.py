@@ -2,18 +2,12 @@
 
 from pydantic import BaseModel
 from datetime import datetime
-from fastapi import HTTPException, Response, Query
-from string_analyzers.string_analyzer import (
-    palindrome,
-    unique_char,
-    word_count,
-    sha256_hash,
-    character_frequency_map,
-)
+from fastapi import HTTPException, Response, Query, Request
+from string_analyzers.string_analyzer import analyse_string, analyse_many, sha256_hash
+from string_analyzers.storage import get_store, StoreError
+from string_analyzers.query import FilterPlan, result_cache
 from typing import List, Dict, Any, Optional
-import os
 import json
-import re
 
 
 class StringAnalyzerCreate(BaseModel):
@@ -29,6 +23,10 @@ class stringAnalyzerProperties(BaseModel):
     character_frequency_map: dict
 
 
+PROPERTY_FIELDS = tuple(stringAnalyzerProperties.model_fields)
+RECORD_FIELDS = ("id", "value", "created_at")
+
+
 class StringAnalyzerOut(BaseModel):
     id: str
     value: str
@@ -36,10 +34,34 @@ class StringAnalyzerOut(BaseModel):
     created_at: str
 
 
+class StringBatchItemOut(BaseModel):
+    index: int
+    status: int
+    id: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class StringBatchOut(BaseModel):
+    results: List[StringBatchItemOut]
+    created: int
+    conflicts: int
+    invalid: int
+
+
 class FilterDataOut(BaseModel):
     data: List[StringAnalyzerOut]
     count: int
     filters_applied: Dict[str, Any]
+    next_cursor: Optional[str] = None
+
+
+class StringStatsOut(BaseModel):
+    count: int
+    palindrome_count: int
+    palindrome_ratio: float
+    length_histogram: Dict[str, int]
+    word_count_histogram: Dict[str, int]
+    character_frequency_map: Dict[str, int]
 
 
 class InterpretedQuery(BaseModel):
@@ -53,34 +75,21 @@ class NaturalLanguageFilteringOut(BaseModel):
     interpreted_query: InterpretedQuery
 
 
-DB_FILE = "DB.json"
-
-
 def analyse_data(data: str):
     """Analyse string"""
     if not data:
         raise HTTPException(
             status_code=400, detail="Invalid request body or missing 'value' field"
         )
-    data_id = sha256_hash(data)
-    length = len(data)
-    is_palindrome = palindrome(data)
-    unique_characters = unique_char(data)
-    wordCount = word_count(data)
-    hashValue = sha256_hash(data)
-    charfreqMap = character_frequency_map(data)
-
-    properties = stringAnalyzerProperties(
-        length=length,
-        is_palindrome=is_palindrome,
-        unique_characters=unique_characters,
-        word_count=wordCount,
-        sha256_hash=hashValue,
-        character_frequency_map=charfreqMap,
-    )
+    return build_string_data(data, analyse_string(data))
+
+
+def build_string_data(data: str, props: dict):
+    """Wrap analysed properties into the response model"""
+    properties = stringAnalyzerProperties(**props)
 
     string_data = StringAnalyzerOut(
-        id=data_id,
+        id=properties.sha256_hash,
         value=data,
         properties=properties,
         created_at=datetime.now().isoformat(),
@@ -91,73 +100,170 @@ def analyse_data(data: str):
 def save_to_db(data: str):
     """Save to db"""
     string_data = analyse_data(data)
+    store = get_store()
 
-    db = {}
-    if os.path.exists(DB_FILE):
-        with open(DB_FILE, "r") as f:
-            try:
-                db = json.load(f)
-            except json.JSONDecodeError:
-                db = {}
-    else:
-        db = {}
-
-    if string_data.id in db:
+    if not store.put_if_absent(string_data.model_dump()):
         raise HTTPException(
             status_code=409, detail="String already exists in the system"
         )
 
-    db[string_data.id] = string_data.model_dump()
-    with open(DB_FILE, "w") as f:
-        json.dump(db, f, indent=4)
-
     return string_data
 
 
-def search_db_for_data(data: str):
-    """key search from db"""
-    if not data:
-        raise HTTPException(
-            status_code=400, detail="Invalid request body or missing 'value' field"
-        )
-
-    if not os.path.exists(DB_FILE):
-        raise HTTPException(
-            status_code=404, detail="Database file not found. No data stored yet."
-        )
+async def read_batch_values(request: Request):
+    """Values from a JSON array body or an NDJSON stream.
 
+    Items may be plain strings or ``{"value": ...}`` objects. NDJSON is
+    parsed line by line as the body arrives.
+    """
     try:
-        with open(DB_FILE, "r") as f:
-            db = json.load(f)
-    except json.JSONDecodeError:
+        if "ndjson" in request.headers.get("content-type", ""):
+            items = []
+            buffer = b""
+            async for chunk in request.stream():
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                items.extend(json.loads(line) for line in lines if line.strip())
+            if buffer.strip():
+                items.append(json.loads(buffer))
+        else:
+            items = json.loads(await request.body())
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid JSON or NDJSON body")
+
+    if not isinstance(items, list):
         raise HTTPException(
-            status_code=500, detail="Database file is corrupted or empty."
+            status_code=400, detail="Request body must be a JSON array of values"
         )
+    return [i.get("value") if isinstance(i, dict) else i for i in items]
+
+
+def save_many_to_db(values: list):
+    """Save a batch of strings with a single storage write.
+
+    Values are deduplicated by sha256 id within the batch and against the
+    store before analysis, so only new strings are analysed and written.
+    """
+    store = get_store()
+    results = []
+    pending = {}
+
+    for index, value in enumerate(values):
+        if not isinstance(value, str):
+            results.append(
+                {
+                    "index": index,
+                    "status": 422,
+                    "detail": "Invalid data type for 'value' (must be string)",
+                }
+            )
+            continue
+        if not value:
+            results.append(
+                {
+                    "index": index,
+                    "status": 400,
+                    "detail": "Invalid request body or missing 'value' field",
+                }
+            )
+            continue
+
+        results.append({"index": index, "id": sha256_hash(value), "value": value})
+
+    ids = [r["id"] for r in results if "value" in r]
+    stored = store.existing_ids(ids)
+    for item in results:
+        value = item.pop("value", None)
+        if value is None:
+            continue
+        if item["id"] in pending or item["id"] in stored:
+            item.update(status=409, detail="String already exists in the system")
+        else:
+            item.update(status=201)
+            pending[item["id"]] = value
+
+    new_values = list(pending.values())
+    records = [
+        build_string_data(value, props).model_dump()
+        for value, props in zip(new_values, analyse_many(new_values))
+    ]
+    if records:
+        # another request may have stored some of them since the check
+        raced = store.put_many(records)
+        for item in results:
+            if item.get("id") in raced and item["status"] == 201:
+                item.update(status=409, detail="String already exists in the system")
+        records = [r for r in records if r["id"] not in raced]
+
+    return {
+        "results": results,
+        "created": len(records),
+        "conflicts": sum(1 for r in results if r["status"] == 409),
+        "invalid": sum(1 for r in results if r["status"] in (400, 422)),
+    }
 
-    data_id = sha256_hash(data)
 
-    if data_id not in db:
+def parse_fields(fields: Optional[str]):
+    """Field names from a comma separated ``fields`` parameter.
+
+    Properties may be named bare or as ``properties.<name>``; ``properties``
+    alone selects all of them. ``id`` is always kept, it is the paging
+    cursor. None means the full record.
+    """
+    if fields is None:
+        return None
+    names = set()
+    for name in fields.split(","):
+        name = name.strip().removeprefix("properties.")
+        if name == "properties":
+            names.update(PROPERTY_FIELDS)
+        elif name:
+            names.add(name)
+    unknown = names - set(PROPERTY_FIELDS) - set(RECORD_FIELDS)
+    if not names:
+        raise HTTPException(status_code=400, detail="No fields requested")
+    if unknown:
         raise HTTPException(
-            status_code=404, detail="String does not exist in the system"
+            status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}"
         )
+    return frozenset(names | {"id"})
+
+
+def wants_frequency_map(fields) -> bool:
+    return fields is None or "character_frequency_map" in fields
 
-    return db[data_id]
 
+def project_record(record: dict, fields) -> dict:
+    """Only the requested fields of a stored record"""
+    if fields is None:
+        return record
+    projected = {k: record[k] for k in RECORD_FIELDS if k in fields}
+    properties = {k: v for k, v in record["properties"].items() if k in fields}
+    if properties:
+        projected["properties"] = properties
+    return projected
 
-def search_db():
-    """Global search"""
-    if not os.path.exists(DB_FILE):
-        raise HTTPException(status_code=500, detail="Database file not found.")
+
+def search_db_for_data(data: str, fields=None):
+    """key search from db"""
+    if not data:
+        raise HTTPException(
+            status_code=400, detail="Invalid request body or missing 'value' field"
+        )
 
     try:
-        with open(DB_FILE, "r") as f:
-            db = json.load(f)
-    except json.JSONDecodeError:
+        record = get_store().get(
+            sha256_hash(data), frequency_map=wants_frequency_map(fields)
+        )
+    except StoreError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if record is None:
         raise HTTPException(
-            status_code=500, detail="Database file is corrupted or empty."
+            status_code=404, detail="String does not exist in the system"
         )
 
-    return db
+    return project_record(record, fields)
 
 
 def del_from_db(data: str):
@@ -165,19 +271,16 @@ def del_from_db(data: str):
     if not data:
         raise HTTPException(status_code=400, detail="Missing data to delete")
 
-    db = search_db()
-    data_id = sha256_hash(data)
+    try:
+        deleted = get_store().delete(sha256_hash(data))
+    except StoreError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-    if data_id not in db:
+    if not deleted:
         raise HTTPException(
             status_code=404, detail="String does not exist in the system"
         )
 
-    del db[data_id]
-
-    with open(DB_FILE, "w") as f:
-        json.dump(db, f, indent=4)
-
     return Response(status_code=204)
 
 
@@ -187,95 +290,89 @@ def filter_by_given_params(
     max_length: Optional[int] = Query(None, ge=0),
     word_count: Optional[int] = None,
     contains_character: Optional[str] = Query(None, max_length=1, min_length=1),
+    contains: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    fields=None,
 ):
-    """Filter by given params"""
-    results = list(search_db().values())
+    """Filter by given params.
+
+    Matches come back lazily in id order, starting after ``cursor`` and
+    stopping after ``limit`` records when given, projected to ``fields``.
+    """
     filters_applied = {}
 
     if is_palindrome is not None:
-        results = [
-            r for r in results if r["properties"]["is_palindrome"] == is_palindrome
-        ]
         filters_applied["is_palindrome"] = is_palindrome
 
     if min_length is not None:
-        results = [r for r in results if r["properties"]["length"] >= min_length]
         filters_applied["min_length"] = min_length
 
     if max_length is not None:
-        results = [r for r in results if r["properties"]["length"] <= max_length]
         filters_applied["max_length"] = max_length
 
     if contains_character is not None:
-        results = [
-            r for r in results if contains_character.lower() in r["value"].lower()
-        ]
         filters_applied["contains_character"] = contains_character
 
     if word_count is not None:
-        results = [r for r in results if r["properties"]["word_count"] == word_count]
         filters_applied["word_count"] = word_count
 
+    if contains is not None:
+        filters_applied["contains"] = contains
+
+    try:
+        results = get_store().iter_query(
+            **filters_applied,
+            after=cursor,
+            limit=limit,
+            frequency_map=wants_frequency_map(fields),
+        )
+    except StoreError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if fields is not None:
+        results = (project_record(r, fields) for r in results)
     return results, filters_applied
 
 
-def detect_filter_params(data: str):
-    """Natural language filter that returns the parsed_filters"""
-    text_lower = data.lower()
-    params: dict[str, Any] = {
-        "word_count": None,
-        "is_palindrome": None,
-        "contains_character": None,
-        "min_length": None,
-        "max_length": None,
-    }
+def stream_ndjson(results, limit: Optional[int] = None):
+    """Serialise records one JSON line at a time.
 
-    if "palindrome" in text_lower or "palindromic" in text_lower:
-        params["is_palindrome"] = True
-
-    word_map = {
-        "single": 1,
-        "one": 1,
-        "two": 2,
-        "three": 3,
-        "four": 4,
-        "five": 5,
-        "six": 6,
-        "seven": 7,
-        "eight": 8,
-        "nine": 9,
-        "ten": 10,
-    }
-    wc_match = re.search(
-        r"\b(single|one|two|three|four|five|six|seven|eight|nine|ten)\s+word",
-        text_lower,
-    )
-    if wc_match:
-        params["word_count"] = word_map[wc_match.group(1)]
-    else:
-        num_match = re.search(r"(\d+)\s+word", text_lower)
-        if num_match:
-            params["word_count"] = int(num_match.group(1))
-
-    min_match = re.search(r"(?:longer|more)\s+than\s+(\d+)", text_lower)
-    if min_match:
-        params["min_length"] = int(min_match.group(1)) + 1
-
-    max_match = re.search(r"(?:shorter|less)\s+than\s+(\d+)", text_lower)
-    if max_match:
-        params["max_length"] = int(max_match.group(1)) - 1
-
-    char_match = re.search(r"(?:letter|character)\s+([a-z])", text_lower)
-    if char_match:
-        params["contains_character"] = char_match.group(1)
-    else:
-        alt_match = re.search(r"(?:containing|contains|with)\s+([a-z])\b", text_lower)
-        if alt_match:
-            params["contains_character"] = alt_match.group(1)
-
-        elif "first vowel" in text_lower:
-            params["contains_character"] = "a"
-        elif "first consonant" in text_lower:
-            params["contains_character"] = "b"
-
-    return params
+    ``results`` may hold one record past ``limit``; then the page ends with
+    a ``{"next_cursor": ...}`` line instead of that record.
+    """
+    last_id = None
+    for count, record in enumerate(results):
+        if limit is not None and count == limit:
+            yield json.dumps({"next_cursor": last_id}) + "\n"
+            return
+        last_id = record["id"]
+        yield json.dumps(record) + "\n"
+
+
+def corpus_stats():
+    """Aggregate statistics of every stored string"""
+    try:
+        return get_store().stats()
+    except StoreError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def filter_by_query_plan(plan: FilterPlan):
+    """Values matching a compiled natural language plan.
+
+    Matching values are cached per plan until the store changes.
+    """
+    filters_applied = plan.filters()
+    store = get_store()
+    try:
+        version = store.version
+        values = result_cache.get(plan, version)
+        if values is None:
+            matches = store.iter_query(**filters_applied, frequency_map=False)
+            values = tuple(r["value"] for r in matches)
+            result_cache.put(plan, version, values)
+    except StoreError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return list(values), filters_applied
@@ -0,0 +1,390 @@
+"""SQL backend for the string analyzer
+
+Stores ``StringAnalyzerOut`` records in the shared ``db.engine`` database so
+every machine sees the same corpus. The filterable properties are indexed
+columns and ``iter_query`` turns the GET /strings filters into a single
+WHERE clause. Selected with ``STRING_STORE_BACKEND=sql``.
+
+The /strings/stats aggregates live in two small tables updated in the same
+transaction as the records, so reading them never scans string_records.
+"""
+
+from collections import Counter
+from typing import Iterable, Iterator, List, Optional
+from sqlalchemy import Column, JSON, Text, delete, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import defer
+from sqlmodel import Field, Session, SQLModel, select
+from string_analyzers.stats import bucket_label
+from string_analyzers.storage import StringStore
+
+
+# keeps IN (...) lists well under driver parameter limits
+ID_CHUNK_SIZE = 500
+# attempts at a batch that raced another writer inserting the same ids
+PUT_ATTEMPTS = 3
+# rows fetched per round trip while a query result is streamed
+ITER_BATCH_SIZE = 500
+
+
+class StringRecord(SQLModel, table=True):
+    __tablename__ = "string_records"
+
+    id: str = Field(primary_key=True, max_length=64)
+    value: str = Field(sa_column=Column(Text, nullable=False))
+    length: int = Field(index=True)
+    is_palindrome: bool = Field(index=True)
+    unique_characters: int
+    word_count: int = Field(index=True)
+    sha256_hash: str = Field(index=True, max_length=64)
+    character_frequency_map: dict = Field(sa_column=Column(JSON, nullable=False))
+    created_at: str = Field(max_length=32)
+
+
+class StringCharFrequency(SQLModel, table=True):
+    """Corpus-wide character totals, kept in step with string_records."""
+
+    __tablename__ = "string_char_frequency"
+
+    # code points, so case-insensitive collations cannot merge "a" and "A"
+    codepoint: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    count: int
+
+
+class StringAggregate(SQLModel, table=True):
+    """Record count, palindrome count and histogram buckets of the corpus.
+
+    ``count`` and ``palindromes`` use bucket 0; ``length`` and
+    ``word_count`` are keyed by the bit length of the value, as in
+    ``string_analyzers.stats``.
+    """
+
+    __tablename__ = "string_aggregates"
+
+    name: str = Field(primary_key=True, max_length=16)
+    bucket: int = Field(primary_key=True, sa_column_kwargs={"autoincrement": False})
+    count: int
+
+
+def aggregate_deltas(rows: Iterable[StringRecord], sign: int = 1) -> Counter:
+    """``StringAggregate`` changes for adding (or removing) ``rows``."""
+    deltas = Counter()
+    for row in rows:
+        deltas[("count", 0)] += sign
+        deltas[("palindromes", 0)] += sign * bool(row.is_palindrome)
+        deltas[("length", int(row.length).bit_length())] += sign
+        deltas[("word_count", int(row.word_count).bit_length())] += sign
+    return deltas
+
+
+def _upsert(session: Session, model, rows: List[dict]):
+    """INSERT ``rows``, adding their count to the rows already there.
+
+    Done in one statement so concurrent writers of a new key cannot both
+    insert it; databases without an upsert fall back to UPDATE then INSERT.
+    """
+    dialect = session.get_bind().dialect.name
+    keys = [c.name for c in model.__table__.primary_key]
+    count = model.__table__.c.count
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        for start in range(0, len(rows), ID_CHUNK_SIZE):
+            stmt = insert(model).values(rows[start : start + ID_CHUNK_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=keys, set_={"count": count + stmt.excluded.count}
+            )
+            session.exec(stmt)
+    elif dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert
+
+        for start in range(0, len(rows), ID_CHUNK_SIZE):
+            stmt = insert(model).values(rows[start : start + ID_CHUNK_SIZE])
+            stmt = stmt.on_duplicate_key_update(count=count + stmt.inserted.count)
+            session.exec(stmt)
+    else:
+        for row in rows:
+            result = session.exec(
+                update(model)
+                .where(*(getattr(model, k) == row[k] for k in keys))
+                .values(count=model.count + row["count"])
+            )
+            if result.rowcount == 0:
+                session.add(model(**row))
+
+
+def _bump(session: Session, model, deltas: Counter, key):
+    """Add (or with negative counts, remove) counts of ``model`` rows.
+
+    ``key`` maps a key of ``deltas`` to the primary key columns.
+    """
+    added = [{**key(k), "count": n} for k, n in deltas.items() if n > 0]
+    if added:
+        _upsert(session, model, added)
+    for k, n in deltas.items():
+        if n < 0:
+            session.exec(
+                update(model)
+                .where(*(getattr(model, c) == v for c, v in key(k).items()))
+                .values(count=model.count + n)
+            )
+    if any(n < 0 for n in deltas.values()):
+        session.exec(delete(model).where(model.count <= 0))
+
+
+def to_row(record: dict) -> StringRecord:
+    props = record["properties"]
+    return StringRecord(
+        id=record["id"],
+        value=record["value"],
+        length=props["length"],
+        is_palindrome=props["is_palindrome"],
+        unique_characters=props["unique_characters"],
+        word_count=props["word_count"],
+        sha256_hash=props["sha256_hash"],
+        character_frequency_map=props["character_frequency_map"],
+        created_at=record["created_at"],
+    )
+
+
+def to_record(row: StringRecord, frequency_map: bool = True) -> dict:
+    properties = {
+        "length": row.length,
+        "is_palindrome": row.is_palindrome,
+        "unique_characters": row.unique_characters,
+        "word_count": row.word_count,
+        "sha256_hash": row.sha256_hash,
+    }
+    if frequency_map:
+        properties["character_frequency_map"] = row.character_frequency_map
+    return {
+        "id": row.id,
+        "value": row.value,
+        "properties": properties,
+        "created_at": row.created_at,
+    }
+
+
+def _select_records(frequency_map: bool):
+    """SELECT of string_records, leaving the JSON map column out if unused."""
+    stmt = select(StringRecord)
+    if not frequency_map:
+        stmt = stmt.options(defer(StringRecord.character_frequency_map))
+    return stmt
+
+
+class SQLStringStore(StringStore):
+    """String records in the SQL database behind ``db.engine``."""
+
+    def __init__(self, engine=None):
+        if engine is None:
+            from db import engine
+        self.engine = engine
+        SQLModel.metadata.create_all(
+            engine,
+            tables=[
+                StringRecord.__table__,
+                StringCharFrequency.__table__,
+                StringAggregate.__table__,
+            ],
+            checkfirst=True,
+        )
+        with Session(engine) as session:
+            if not session.exec(select(StringRecord.id)).first():
+                return
+            # records written before the aggregate tables existed
+            if not session.exec(select(StringCharFrequency.codepoint)).first():
+                totals = Counter()
+                for freq in session.exec(select(StringRecord.character_frequency_map)):
+                    totals.update(freq)
+                self._bump_characters(session, totals)
+            if not session.exec(select(StringAggregate.name)).first():
+                self._bump_aggregates(session, self._scan_aggregates(session))
+            session.commit()
+
+    def _bump_characters(self, session: Session, deltas: Counter):
+        """Add (or with negative counts, remove) character totals."""
+        _bump(session, StringCharFrequency, deltas, lambda c: {"codepoint": ord(c)})
+
+    def _bump_aggregates(self, session: Session, deltas: Counter):
+        """Add (or with negative counts, remove) counts and histogram buckets."""
+        _bump(
+            session, StringAggregate, deltas, lambda k: {"name": k[0], "bucket": k[1]}
+        )
+
+    def _scan_aggregates(self, session: Session) -> Counter:
+        deltas = Counter()
+        deltas[("count", 0)] = session.exec(
+            select(func.count()).select_from(StringRecord)
+        ).one()
+        deltas[("palindromes", 0)] = session.exec(
+            select(func.count())
+            .select_from(StringRecord)
+            .where(StringRecord.is_palindrome.is_(True))
+        ).one()
+        for name, column in (
+            ("length", StringRecord.length),
+            ("word_count", StringRecord.word_count),
+        ):
+            for value, n in session.exec(select(column, func.count()).group_by(column)):
+                deltas[(name, int(value).bit_length())] += n
+        return deltas
+
+    def get(self, data_id: str, frequency_map: bool = True) -> Optional[dict]:
+        stmt = _select_records(frequency_map).where(StringRecord.id == data_id)
+        with Session(self.engine) as session:
+            row = session.exec(stmt).first()
+            return to_record(row, frequency_map) if row else None
+
+    def __contains__(self, data_id: str) -> bool:
+        with Session(self.engine) as session:
+            stmt = select(StringRecord.id).where(StringRecord.id == data_id)
+            return session.exec(stmt).first() is not None
+
+    def existing_ids(self, ids: Iterable[str]) -> set:
+        with Session(self.engine) as session:
+            return self._existing_ids(session, list(ids))
+
+    def _existing_ids(self, session: Session, ids: List[str]) -> set:
+        existing = set()
+        for start in range(0, len(ids), ID_CHUNK_SIZE):
+            chunk = ids[start : start + ID_CHUNK_SIZE]
+            stmt = select(StringRecord.id).where(StringRecord.id.in_(chunk))
+            existing.update(session.exec(stmt).all())
+        return existing
+
+    def put(self, record: dict):
+        self.put_many([record])
+
+    def put_many(self, records: Iterable[dict]) -> set:
+        """Insert the records not stored yet, returns the ids that were.
+
+        A concurrent writer can insert one of the ids between the check and
+        the insert; the batch is then rolled back and checked again.
+        """
+        records = {r["id"]: r for r in records}
+        for attempt in range(PUT_ATTEMPTS):
+            try:
+                return self._insert_new(records)
+            except IntegrityError:
+                if attempt == PUT_ATTEMPTS - 1:
+                    raise
+
+    def _insert_new(self, records: dict) -> set:
+        with Session(self.engine) as session:
+            existing = self._existing_ids(session, list(records))
+            new_rows = [to_row(r) for i, r in records.items() if i not in existing]
+            added = Counter()
+            for row in new_rows:
+                session.add(row)
+                added.update(row.character_frequency_map)
+            session.flush()
+            self._bump_characters(session, added)
+            self._bump_aggregates(session, aggregate_deltas(new_rows))
+            session.commit()
+            return existing
+
+    def delete(self, data_id: str) -> bool:
+        with Session(self.engine) as session:
+            row = session.exec(
+                select(
+                    StringRecord.character_frequency_map,
+                    StringRecord.is_palindrome,
+                    StringRecord.length,
+                    StringRecord.word_count,
+                ).where(StringRecord.id == data_id)
+            ).first()
+            result = session.exec(
+                delete(StringRecord).where(StringRecord.id == data_id)
+            )
+            if result.rowcount and row:
+                freq = row.character_frequency_map or {}
+                self._bump_characters(
+                    session, Counter({c: -n for c, n in freq.items()})
+                )
+                self._bump_aggregates(session, aggregate_deltas([row], sign=-1))
+            session.commit()
+            return result.rowcount > 0
+
+    def stats(self) -> dict:
+        with Session(self.engine) as session:
+            aggregates = session.exec(
+                select(
+                    StringAggregate.name, StringAggregate.bucket, StringAggregate.count
+                ).order_by(StringAggregate.name, StringAggregate.bucket)
+            ).all()
+            characters = session.exec(
+                select(StringCharFrequency.codepoint, StringCharFrequency.count)
+            ).all()
+
+        totals = {"count": 0, "palindromes": 0, "length": {}, "word_count": {}}
+        for name, bucket, n in aggregates:
+            if name in ("count", "palindromes"):
+                totals[name] = n
+            else:
+                totals[name][bucket_label(bucket)] = n
+        count, palindromes = totals["count"], totals["palindromes"]
+        return {
+            "count": count,
+            "palindrome_count": palindromes,
+            "palindrome_ratio": palindromes / count if count else 0.0,
+            "length_histogram": totals["length"],
+            "word_count_histogram": totals["word_count"],
+            "character_frequency_map": {chr(cp): n for cp, n in characters},
+        }
+
+    def values(self) -> Iterable[dict]:
+        with Session(self.engine) as session:
+            return [to_record(r) for r in session.exec(select(StringRecord)).all()]
+
+    def __len__(self) -> int:
+        with Session(self.engine) as session:
+            return session.exec(select(func.count()).select_from(StringRecord)).one()
+
+    def iter_query(
+        self,
+        is_palindrome: Optional[bool] = None,
+        min_length: Optional[int] = None,
+        max_length: Optional[int] = None,
+        word_count: Optional[int] = None,
+        contains_character: Optional[str] = None,
+        contains: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        frequency_map: bool = True,
+    ) -> Iterator[dict]:
+        conditions: List = []
+        if is_palindrome is not None:
+            conditions.append(StringRecord.is_palindrome == is_palindrome)
+        if min_length is not None:
+            conditions.append(StringRecord.length >= min_length)
+        if max_length is not None:
+            conditions.append(StringRecord.length <= max_length)
+        if word_count is not None:
+            conditions.append(StringRecord.word_count == word_count)
+        for needle in (contains_character, contains):
+            if needle is not None:
+                conditions.append(
+                    func.lower(StringRecord.value).contains(
+                        needle.lower(), autoescape=True
+                    )
+                )
+        if after is not None:
+            conditions.append(StringRecord.id > after)
+
+        stmt = (
+            _select_records(frequency_map).where(*conditions).order_by(StringRecord.id)
+        )
+        if limit is not None:
+            stmt = stmt.limit(limit)
+
+        stmt = stmt.execution_options(yield_per=ITER_BATCH_SIZE)
+        return self._stream(stmt, frequency_map)
+
+    def _stream(self, stmt, frequency_map: bool) -> Iterator[dict]:
+        """Records of ``stmt`` fetched in batches, the session open meanwhile."""
+        with Session(self.engine) as session:
+            for row in session.exec(stmt):
+                yield to_record(row, frequency_map)
@@ -0,0 +1,68 @@
+"""Running aggregates over the string corpus for /strings/stats
+
+The totals are adjusted record by record as the store changes, so reading
+them never touches the stored records. Lengths and word counts are grouped
+into power-of-two buckets ("1", "2-3", "4-7", ...) to keep the response
+size bounded however varied the corpus is.
+"""
+
+from collections import Counter
+
+
+def bucket_label(bucket: int) -> str:
+    if bucket <= 1:
+        return str(bucket)
+    low, high = 1 << (bucket - 1), (1 << bucket) - 1
+    return f"{low}-{high}"
+
+
+class CorpusStats:
+    """Count, palindromes, histograms and character totals of a corpus."""
+
+    def __init__(self):
+        self.count = 0
+        self.palindromes = 0
+        self.lengths: Counter = Counter()
+        self.word_counts: Counter = Counter()
+        self.characters: Counter = Counter()
+
+    def add(self, record: dict):
+        props = record["properties"]
+        self.count += 1
+        self.palindromes += bool(props["is_palindrome"])
+        self.lengths[props["length"].bit_length()] += 1
+        self.word_counts[props["word_count"].bit_length()] += 1
+        self.characters.update(props["character_frequency_map"])
+
+    def remove(self, record: dict):
+        props = record["properties"]
+        self.count -= 1
+        self.palindromes -= bool(props["is_palindrome"])
+        self.lengths[props["length"].bit_length()] -= 1
+        self.word_counts[props["word_count"].bit_length()] -= 1
+        for char, n in props["character_frequency_map"].items():
+            self.characters[char] -= n
+            if self.characters[char] <= 0:
+                del self.characters[char]
+
+    def add_columns(self, lengths, word_counts, palindromes, characters: dict):
+        """Fold in a whole columnar snapshot without building its records."""
+        self.count += len(lengths)
+        self.palindromes += sum(palindromes)
+        self.lengths.update(int(n).bit_length() for n in lengths)
+        self.word_counts.update(int(n).bit_length() for n in word_counts)
+        self.characters.update(characters)
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "palindrome_count": self.palindromes,
+            "palindrome_ratio": self.palindromes / self.count if self.count else 0.0,
+            "length_histogram": {
+                bucket_label(b): n for b, n in sorted(self.lengths.items()) if n
+            },
+            "word_count_histogram": {
+                bucket_label(b): n for b, n in sorted(self.word_counts.items()) if n
+            },
+            "character_frequency_map": dict(self.characters),
+        }
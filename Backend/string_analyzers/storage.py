@@ -0,0 +1,756 @@
+"""String Analyzer Storage Backends
+
+Records are the ``StringAnalyzerOut.model_dump()`` dicts keyed by their
+sha256 ``id``. The file backends are:
+
+- ``JSONFileStore``: the original layout, the whole ``DB.json`` is read
+  and rewritten on every change.
+- ``AppendLogStore``: ``DB.json`` is kept as a snapshot and every change is
+  appended to ``DB.json.log``. Startup loads the snapshot and replays the
+  log into memory, and the log is folded back into the snapshot once it
+  grows past the size of the corpus. Filters are answered from a
+  ``StringIndex`` built on the first filtered query after a load and
+  kept in step with the records from then on.
+
+The backend is picked with ``STRING_STORE_BACKEND`` (``log``, ``json`` or
+``sql``, see ``string_analyzers.sql_store``).
+
+Both backends are safe to share between threads and uvicorn workers: every
+operation holds an advisory ``flock`` on ``DB.json.lock`` (shared for reads,
+exclusive for writes), snapshots are written to a temp file and moved into
+place with ``os.replace``, and a log store catches up with whatever other
+processes appended before it answers. ``STRING_STORE_FSYNC`` controls
+durability: ``always`` (every append), ``snapshot`` (default, snapshots
+only) or ``never``.
+
+With ``STRING_SNAPSHOT_FORMAT=columnar`` the log store keeps its snapshot
+in the memory-mapped binary layout of ``string_analyzers.columnar``
+(``DB.strcol``) instead of ``DB.json``, importing ``DB.json`` on first start.
+"""
+
+import abc
+import heapq
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from string_analyzers.columnar import (
+    ColumnarSnapshot,
+    SnapshotRecords,
+    write_columnar,
+)
+from string_analyzers.index import StringIndex
+from string_analyzers.stats import CorpusStats
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, threads are still locked
+    fcntl = None
+
+
+DB_FILE = "DB.json"
+COLUMNAR_FILE = "DB.strcol"
+SNAPSHOT_FORMAT = os.getenv("STRING_SNAPSHOT_FORMAT", "json")
+STRING_STORE_BACKEND = os.getenv("STRING_STORE_BACKEND", "log")
+COMPACT_MIN_ENTRIES = int(os.getenv("STRING_STORE_COMPACT_MIN", "1000"))
+FSYNC_POLICY = os.getenv("STRING_STORE_FSYNC", "snapshot")
+
+logger = logging.getLogger(__name__)
+
+
+class StoreError(Exception):
+    """Raised when the underlying storage cannot be read."""
+
+
+def read_json_db(path: str) -> Dict[str, dict]:
+    """Read a ``DB.json`` style file, an empty dict if it does not exist."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r") as f:
+            db = json.load(f)
+    except json.JSONDecodeError:
+        raise StoreError("Database file is corrupted or empty.")
+    return db if isinstance(db, dict) else {}
+
+
+def write_json_db(
+    path: str, records: Dict[str, dict], backup_path: Optional[str] = None
+):
+    """Atomically write records in the ``DB.json`` layout."""
+    _atomic_write(path, lambda f: json.dump(records, f, indent=4), "w", backup_path)
+
+
+def write_columnar_db(
+    path: str, records: Iterable[dict], backup_path: Optional[str] = None
+):
+    """Atomically write records as a columnar snapshot."""
+    _atomic_write(path, lambda f: write_columnar(f, records), "wb", backup_path)
+
+
+def read_columnar_db(path: str) -> SnapshotRecords:
+    try:
+        return SnapshotRecords(ColumnarSnapshot(path))
+    except (ValueError, TypeError, struct.error) as e:
+        raise StoreError(f"Columnar snapshot is corrupted: {e}")
+
+
+def _atomic_write(path: str, write, mode: str, backup_path: Optional[str] = None):
+    """Write a file next to ``path`` and move it over with ``os.replace``.
+
+    Readers see either the old or the new file. When ``backup_path`` is
+    given the previous file is kept there.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+            if FSYNC_POLICY != "never":
+                f.flush()
+                os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        if backup_path and os.path.exists(path):
+            os.replace(path, backup_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    if FSYNC_POLICY != "never":
+        _fsync_dir(directory)
+
+
+def _read_log(path: str, offset: int = 0) -> Tuple[List[dict], int, int]:
+    """Entries of the complete lines past ``offset``.
+
+    Returns the entries, the bytes they span and the number of lines.
+    """
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            chunk = f.read()
+    except FileNotFoundError:
+        return [], 0, 0
+    # a line without its newline is a write still in flight, or torn
+    end = chunk.rfind(b"\n") + 1
+    lines = chunk[:end].splitlines()
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    return entries, end, len(lines)
+
+
+def _fsync_dir(directory: str):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _file_id(path: str):
+    """Identity of a file on disk, changes when it is replaced or rewritten."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class StoreLock:
+    """Re-entrant thread lock plus an advisory ``flock`` across processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    @contextmanager
+    def hold(self, exclusive: bool = False):
+        with self._thread_lock:
+            if self._depth == 0 and fcntl is not None:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+
+class StringStore(abc.ABC):
+    """Interface shared by the string analyzer backends."""
+
+    @property
+    def version(self):
+        """Changes whenever the stored data changes, None if unknown."""
+        return None
+
+    @abc.abstractmethod
+    def get(self, data_id: str, frequency_map: bool = True) -> Optional[dict]:
+        """The record, without ``character_frequency_map`` if not wanted."""
+
+    @abc.abstractmethod
+    def put(self, record: dict):
+        """Store ``record``, replacing one with the same id."""
+
+    def put_many(self, records: Iterable[dict]) -> set:
+        """Store the records not stored yet, returns the ids that were."""
+        records = {r["id"]: r for r in records}
+        existing = self.existing_ids(records)
+        for data_id, record in records.items():
+            if data_id not in existing:
+                self.put(record)
+        return existing
+
+    def put_if_absent(self, record: dict) -> bool:
+        """Store ``record`` unless its id is stored, returns whether it was."""
+        return record["id"] not in self.put_many([record])
+
+    @abc.abstractmethod
+    def delete(self, data_id: str) -> bool:
+        """Remove the record, returns whether it was stored."""
+
+    @abc.abstractmethod
+    def values(self) -> Iterable[dict]:
+        """Every stored record."""
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Number of stored records."""
+
+    def __contains__(self, data_id: str) -> bool:
+        return self.get(data_id) is not None
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.values())
+
+    def existing_ids(self, ids: Iterable[str]) -> set:
+        """The subset of ``ids`` that is already stored."""
+        return {i for i in ids if i in self}
+
+    def query(self, **filters) -> List[dict]:
+        """Records matching every given filter, ordered by id."""
+        return list(self.iter_query(**filters))
+
+    def iter_query(
+        self,
+        is_palindrome: Optional[bool] = None,
+        min_length: Optional[int] = None,
+        max_length: Optional[int] = None,
+        word_count: Optional[int] = None,
+        contains_character: Optional[str] = None,
+        contains: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        frequency_map: bool = True,
+    ) -> Iterator[dict]:
+        """Matching records ordered by id, starting after the ``after`` id."""
+        needles = [n.lower() for n in (contains_character, contains) if n is not None]
+        matches = []
+        for r in self.values():
+            props = r["properties"]
+            if after is not None and r["id"] <= after:
+                continue
+            if is_palindrome is not None and props["is_palindrome"] != is_palindrome:
+                continue
+            if min_length is not None and props["length"] < min_length:
+                continue
+            if max_length is not None and props["length"] > max_length:
+                continue
+            if word_count is not None and props["word_count"] != word_count:
+                continue
+            if needles and not all(n in r["value"].lower() for n in needles):
+                continue
+            matches.append(r)
+        ordered = _first_by_id(matches, limit, key=lambda r: r["id"])
+        if not frequency_map:
+            return map(without_frequency_map, ordered)
+        return iter(ordered)
+
+    def stats(self) -> dict:
+        """Corpus aggregates for /strings/stats."""
+        stats = CorpusStats()
+        for record in self.values():
+            stats.add(record)
+        return stats.summary()
+
+    def import_json(self, path: str) -> int:
+        """Load records from a ``DB.json`` file, returns how many were added."""
+        added = 0
+        for data_id, record in read_json_db(path).items():
+            if data_id not in self:
+                self.put(record)
+                added += 1
+        return added
+
+    def export_json(self, path: str):
+        """Dump every record to ``path`` in the ``DB.json`` layout."""
+        write_json_db(path, {r["id"]: r for r in self.values()})
+
+
+class JSONFileStore(StringStore):
+    """Whole-file JSON store, every call goes to disk."""
+
+    def __init__(self, path: str = DB_FILE):
+        self.path = path
+        self._lock = StoreLock(f"{path}.lock")
+
+    def _load(self) -> Dict[str, dict]:
+        with self._lock.hold():
+            return read_json_db(self.path)
+
+    @property
+    def version(self):
+        return _file_id(self.path) or 0
+
+    def get(self, data_id: str, frequency_map: bool = True) -> Optional[dict]:
+        record = self._load().get(data_id)
+        if record is None or frequency_map:
+            return record
+        return without_frequency_map(record)
+
+    def put(self, record: dict):
+        self._write([record], replace=True)
+
+    def put_many(self, records: Iterable[dict]) -> set:
+        return self._write(records, replace=False)
+
+    def _write(self, records: Iterable[dict], replace: bool) -> set:
+        with self._lock.hold(exclusive=True):
+            try:
+                db = self._load()
+            except StoreError:
+                db = {}
+            records = {r["id"]: r for r in records}
+            existing = set() if replace else {i for i in records if i in db}
+            if len(existing) < len(records):
+                db.update((i, r) for i, r in records.items() if i not in existing)
+                write_json_db(self.path, db)
+            return existing
+
+    def delete(self, data_id: str) -> bool:
+        with self._lock.hold(exclusive=True):
+            db = self._load()
+            if data_id not in db:
+                return False
+            del db[data_id]
+            write_json_db(self.path, db)
+            return True
+
+    def existing_ids(self, ids: Iterable[str]) -> set:
+        db = self._load()
+        return {i for i in ids if i in db}
+
+    def values(self) -> Iterable[dict]:
+        return list(self._load().values())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+
+class AppendLogStore(StringStore):
+    """Snapshot plus append-only log, served from memory.
+
+    Compaction keeps the previous snapshot in ``DB.json.bak`` and the log
+    folded into the current one in ``DB.json.log.bak``. If the snapshot
+    cannot be parsed the store replays both backups and the current log,
+    moves the broken file to ``DB.json.corrupt`` and writes a fresh snapshot.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: str = DB_FILE,
+        log_path: Optional[str] = None,
+        compact_min_entries: int = COMPACT_MIN_ENTRIES,
+        snapshot_format: str = "json",
+    ):
+        self.snapshot_path = snapshot_path
+        self.snapshot_format = snapshot_format
+        self.backup_path = f"{snapshot_path}.bak"
+        self.log_path = log_path or f"{snapshot_path}.log"
+        self.log_backup_path = f"{self.log_path}.bak"
+        self.compact_min_entries = compact_min_entries
+        self._lock = StoreLock(f"{snapshot_path}.lock")
+        self._records: Dict[str, dict] = {}
+        self._index: Optional[StringIndex] = None
+        self._stats = CorpusStats()
+        self._snapshot_id = None
+        self._snapshot_corrupt = False
+        self._log_offset = 0
+        self._log_entries = 0
+        self._version = 0
+        self.load()
+
+    @property
+    def version(self):
+        with self._lock.hold():
+            self._sync()
+            return self._version
+
+    def load(self):
+        """Rebuild the in-memory view from the snapshot and the log."""
+        with self._lock.hold(exclusive=True):
+            self._load()
+            if self._snapshot_corrupt:
+                self._compact()
+
+    def _load(self):
+        self._snapshot_id = _file_id(self.snapshot_path)
+        self._snapshot_corrupt = False
+        read = read_columnar_db if self.snapshot_format == "columnar" else read_json_db
+        try:
+            if self._snapshot_id is None:
+                # a crash mid-compaction leaves only the backup behind
+                records = (
+                    read(self.backup_path) if os.path.exists(self.backup_path) else {}
+                )
+            else:
+                records = read(self.snapshot_path)
+        except StoreError:
+            logger.error(
+                "String store snapshot %s is corrupted, rebuilding from %s",
+                self.snapshot_path,
+                self.backup_path,
+            )
+            self._snapshot_corrupt = True
+            try:
+                records = (
+                    read(self.backup_path) if os.path.exists(self.backup_path) else {}
+                )
+            except StoreError:
+                records = {}
+
+        self._records = records
+        # decoding every value is left to the first query that needs it
+        self._index = None
+        self._stats = CorpusStats()
+        if isinstance(records, SnapshotRecords):
+            snapshot = records.snapshot
+            self._stats.add_columns(
+                snapshot.lengths,
+                snapshot.word_counts,
+                snapshot.palindromes,
+                snapshot.character_totals(),
+            )
+        else:
+            for record in records.values():
+                self._stats.add(record)
+        if self._snapshot_id is None or self._snapshot_corrupt:
+            # the backup is only current with the log that was folded into it
+            for entry in _read_log(self.log_backup_path)[0]:
+                self._apply(entry)
+        self._log_offset = 0
+        self._log_entries = 0
+        self._replay_log()
+        self._version += 1
+
+    def _replay_log(self) -> int:
+        """Apply complete log lines past the current offset."""
+        entries, end, lines = _read_log(self.log_path, self._log_offset)
+        for entry in entries:
+            self._apply(entry)
+        self._log_entries += lines
+        self._log_offset += end
+        return len(entries)
+
+    def _sync(self):
+        """Catch up with changes other processes made since the last look."""
+        if _file_id(self.snapshot_path) != self._snapshot_id:
+            self._load()
+            return
+        try:
+            size = os.path.getsize(self.log_path)
+        except FileNotFoundError:
+            size = 0
+        if size < self._log_offset:
+            self._load()
+        elif size > self._log_offset and self._replay_log():
+            self._version += 1
+
+    def _apply(self, entry: dict):
+        if entry.get("op") == "put":
+            record = entry["record"]
+            old = self._records.get(record["id"])
+            if old is not None:
+                if self._index is not None:
+                    self._index.remove(old)
+                self._stats.remove(old)
+            self._records[record["id"]] = record
+            if self._index is not None:
+                self._index.add(record)
+            self._stats.add(record)
+        elif entry.get("op") == "del":
+            old = self._records.pop(entry["id"], None)
+            if old is not None:
+                if self._index is not None:
+                    self._index.remove(old)
+                self._stats.remove(old)
+
+    def _indexed(self) -> StringIndex:
+        if self._index is None:
+            records = self._records
+            if isinstance(records, SnapshotRecords):
+                records = records.summaries()
+            else:
+                records = records.values()
+            self._index = StringIndex()
+            for record in records:
+                self._index.add(record)
+        return self._index
+
+    def _append(self, entries: list):
+        data = "".join(
+            json.dumps(e, separators=(",", ":")) + "\n" for e in entries
+        ).encode("utf-8")
+        with self._lock.hold(exclusive=True):
+            self._sync()
+            if self._snapshot_corrupt:
+                self._compact()
+            if os.path.exists(self.log_path):
+                # nobody else can be writing, anything past the offset is torn
+                os.truncate(self.log_path, self._log_offset)
+            with open(self.log_path, "ab") as f:
+                f.write(data)
+                if FSYNC_POLICY == "always":
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._log_offset += len(data)
+            for entry in entries:
+                self._apply(entry)
+            self._version += 1
+            self._log_entries += len(entries)
+            if self._log_entries >= max(self.compact_min_entries, len(self._records)):
+                self._compact()
+
+    def compact(self):
+        """Fold the log into the snapshot and start a fresh log."""
+        with self._lock.hold(exclusive=True):
+            self._sync()
+            self._compact()
+
+    def _compact(self):
+        backup_path = self.backup_path
+        if self._snapshot_corrupt:
+            if os.path.exists(self.snapshot_path):
+                os.replace(self.snapshot_path, f"{self.snapshot_path}.corrupt")
+            backup_path = None
+        if self.snapshot_format == "columnar":
+            write_columnar_db(
+                self.snapshot_path, self._records.values(), backup_path=backup_path
+            )
+            self._rotate_log(backup_path is not None)
+            # map the new file so the in-memory overlay can be dropped
+            self._load()
+            return
+        write_json_db(self.snapshot_path, self._records, backup_path=backup_path)
+        self._rotate_log(backup_path is not None)
+        self._snapshot_id = _file_id(self.snapshot_path)
+        self._snapshot_corrupt = False
+        self._log_offset = 0
+        self._log_entries = 0
+
+    def _rotate_log(self, new_backup: bool):
+        """Keep the folded log next to the backup it applies to.
+
+        Without a new backup (a corrupt snapshot was replaced) the old
+        backup is still the base, so the log is added to its backup log.
+        """
+        if not os.path.exists(self.log_path):
+            open(self.log_path, "w").close()
+            return
+        if new_backup:
+            os.replace(self.log_path, self.log_backup_path)
+        else:
+            with open(self.log_path, "rb") as f:
+                data = f.read(self._log_offset)
+            with open(self.log_backup_path, "ab") as f:
+                f.write(data)
+        open(self.log_path, "w").close()
+
+    def _lookup(self, data_id: str, frequency_map: bool = True) -> Optional[dict]:
+        records = self._records
+        if isinstance(records, SnapshotRecords):
+            # columnar rows skip counting characters nobody asked for
+            return records.lookup(data_id, frequency_map)
+        record = records.get(data_id)
+        if record is None or frequency_map:
+            return record
+        return without_frequency_map(record)
+
+    def get(self, data_id: str, frequency_map: bool = True) -> Optional[dict]:
+        with self._lock.hold():
+            self._sync()
+            return self._lookup(data_id, frequency_map)
+
+    def put(self, record: dict):
+        self._append([{"op": "put", "record": record}])
+
+    def put_many(self, records: Iterable[dict]) -> set:
+        records = {r["id"]: r for r in records}
+        with self._lock.hold(exclusive=True):
+            self._sync()
+            existing = {i for i in records if i in self._records}
+            new = [r for i, r in records.items() if i not in existing]
+            if new:
+                self._append([{"op": "put", "record": r} for r in new])
+            return existing
+
+    def delete(self, data_id: str) -> bool:
+        with self._lock.hold(exclusive=True):
+            self._sync()
+            if data_id not in self._records:
+                return False
+            self._append([{"op": "del", "id": data_id}])
+            return True
+
+    def values(self) -> Iterable[dict]:
+        with self._lock.hold():
+            self._sync()
+            return list(self._records.values())
+
+    def __len__(self) -> int:
+        with self._lock.hold():
+            self._sync()
+            return len(self._records)
+
+    def __contains__(self, data_id: str) -> bool:
+        with self._lock.hold():
+            self._sync()
+            return data_id in self._records
+
+    def existing_ids(self, ids: Iterable[str]) -> set:
+        with self._lock.hold():
+            self._sync()
+            return {i for i in ids if i in self._records}
+
+    def stats(self) -> dict:
+        with self._lock.hold():
+            self._sync()
+            return self._stats.summary()
+
+    def iter_query(
+        self,
+        is_palindrome: Optional[bool] = None,
+        min_length: Optional[int] = None,
+        max_length: Optional[int] = None,
+        word_count: Optional[int] = None,
+        contains_character: Optional[str] = None,
+        contains: Optional[str] = None,
+        after: Optional[str] = None,
+        limit: Optional[int] = None,
+        frequency_map: bool = True,
+    ) -> Iterator[dict]:
+        with self._lock.hold():
+            self._sync()
+            ids = self._indexed().query(
+                is_palindrome=is_palindrome,
+                min_length=min_length,
+                max_length=max_length,
+                word_count=word_count,
+                contains_character=contains_character,
+                contains=contains,
+            )
+            needles = [
+                n.lower()
+                for n in (contains_character, contains)
+                if n is not None and len(n.lower()) > 1
+            ]
+            if needles:
+                ids = {
+                    i
+                    for i in ids
+                    if all(
+                        n in self._lookup(i, frequency_map=False)["value"].lower()
+                        for n in needles
+                    )
+                }
+            if after is not None:
+                ids = [i for i in ids if i > after]
+            ordered = _first_by_id(ids, limit)
+        records = (self._lookup(i, frequency_map) for i in ordered)
+        return (r for r in records if r is not None)
+
+    def import_json(self, path: str) -> int:
+        incoming = read_json_db(path)
+        with self._lock.hold(exclusive=True):
+            self._sync()
+            new = [r for i, r in incoming.items() if i not in self._records]
+            if new:
+                self.put_many(new)
+        return len(new)
+
+
+def without_frequency_map(record: dict) -> dict:
+    """Shallow copy of ``record`` minus ``character_frequency_map``."""
+    props = dict(record["properties"])
+    props.pop("character_frequency_map", None)
+    return {**record, "properties": props}
+
+
+def _first_by_id(items, limit: Optional[int], key=None) -> list:
+    """Sorted items, only the first ``limit`` of them when a limit is given."""
+    if limit is None:
+        return sorted(items, key=key)
+    return heapq.nsmallest(limit, items, key=key)
+
+
+def create_store(backend: str = STRING_STORE_BACKEND, path: str = DB_FILE):
+    """Build a store for the given backend name."""
+    if backend == "json":
+        return JSONFileStore(path)
+    if backend == "log" and SNAPSHOT_FORMAT == "columnar":
+        store = AppendLogStore(COLUMNAR_FILE, snapshot_format="columnar")
+        if not len(store) and os.path.exists(path):
+            store.import_json(path)
+        return store
+    if backend == "log":
+        return AppendLogStore(path)
+    if backend == "sql":
+        from string_analyzers.sql_store import SQLStringStore
+
+        return SQLStringStore()
+    raise ValueError(f"Unknown string store backend: {backend}")
+
+
+@lru_cache(maxsize=1)
+def get_store() -> StringStore:
+    """Process-wide store used by the API."""
+    return create_store()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="String analyzer store tools")
+    parser.add_argument("action", choices=["import", "export", "compact"])
+    parser.add_argument("path", nargs="?", default=DB_FILE)
+    args = parser.parse_args()
+
+    store = get_store()
+    if args.action == "import":
+        print(f"Imported {store.import_json(args.path)} records")
+    elif args.action == "export":
+        store.export_json(args.path)
+        print(f"Exported {len(store)} records to {args.path}")
+    elif isinstance(store, AppendLogStore):
+        store.compact()
+        print(f"Compacted {len(store)} records into {store.snapshot_path}")
@@ -1,7 +1,22 @@
 """Functions That Analyze Strings"""
 
 import re
+import os
 import hashlib
+import logging
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+
+WORD_PATTERN = re.compile(r"[A-Za-z0-9]+")
+# batches smaller than this (in characters) are analysed in-process
+PARALLEL_MIN_CHARS = int(os.getenv("STRING_BATCH_PARALLEL_MIN_CHARS", "1000000"))
+BATCH_WORKERS = int(os.getenv("STRING_BATCH_WORKERS", "0")) or None
+
+logger = logging.getLogger(__name__)
 
 
 def palindrome(string: str):
@@ -44,6 +59,58 @@ def character_frequency_map(string: str):
     return word_map
 
 
+def analyse_string(string: str):
+    """All string properties at once.
+
+    Each property is a single C-level pass (``Counter``, slice reversal,
+    ``re.subn`` and one sha256), so large inputs are never walked by a
+    Python loop and the hash is only computed once.
+    """
+    frequency = Counter(string)
+    return {
+        "length": len(string),
+        "is_palindrome": string == string[::-1],
+        "unique_characters": len(frequency),
+        "word_count": WORD_PATTERN.subn("", string)[1],
+        "sha256_hash": sha256_hash(string),
+        "character_frequency_map": dict(frequency),
+    }
+
+
+@lru_cache(maxsize=1)
+def _analysis_pool():
+    # started from a threadpool thread, so forking the server is not safe
+    methods = multiprocessing.get_all_start_methods()
+    method = "forkserver" if "forkserver" in methods else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=BATCH_WORKERS, mp_context=multiprocessing.get_context(method)
+    )
+
+
+def shutdown_analysis_pool():
+    """Stop the batch worker processes, if any were started."""
+    if _analysis_pool.cache_info().currsize:
+        _analysis_pool().shutdown(cancel_futures=True)
+        _analysis_pool.cache_clear()
+
+
+def analyse_many(strings: list):
+    """analyse_string over a list, spread across a process pool when large.
+
+    If the pool's workers die the pool is dropped, so the next large batch
+    starts a new one, and this batch is analysed in-process.
+    """
+    if len(strings) < 2 or sum(map(len, strings)) < PARALLEL_MIN_CHARS:
+        return [analyse_string(s) for s in strings]
+    chunksize = max(1, len(strings) // (4 * (os.cpu_count() or 1)))
+    try:
+        return list(_analysis_pool().map(analyse_string, strings, chunksize=chunksize))
+    except BrokenProcessPool:
+        logger.exception("String analysis pool broke, analysing in-process")
+        shutdown_analysis_pool()
+        return list(map(analyse_string, strings))
+
+
 """if __name__ == '__main__':
     sample = "racecar"
     print(palindrome(sample))
@@ -0,0 +1,42 @@
+from string_analyzers.query import FilterPlan, ResultCache, compile_query
+
+
+def test_compile_query_parses_filters():
+    cases = {
+        "all single word palindromic strings": {"word_count": 1, "is_palindrome": True},
+        "strings longer than 10 characters": {"min_length": 11},
+        "strings with 3 words shorter than 20": {"word_count": 3, "max_length": 19},
+        "strings containing the letter z": {"contains_character": "z"},
+        "palindromic strings that contain the first vowel": {
+            "is_palindrome": True,
+            "contains_character": "a",
+        },
+        "strings with x and the character q": {"contains_character": "q"},
+        "ONE   word strings": {"word_count": 1},
+        "strings containing 'abc'": {"contains": "abc"},
+        'two word strings with the substring "lo w"': {
+            "word_count": 2,
+            "contains": "lo w",
+        },
+        "nothing useful here": {},
+    }
+    for query, expected in cases.items():
+        assert compile_query(query).filters() == expected, query
+
+
+def test_compile_query_is_cached_by_normalised_text():
+    assert compile_query("Two word  strings") is compile_query(" two WORD strings")
+    # whitespace inside quotes is part of the substring
+    spaced = compile_query("strings  containing 'a  b'")
+    assert spaced.contains == "a  b"
+    assert spaced is not compile_query("strings containing 'a b'")
+
+
+def test_result_cache_invalidates_on_version_change():
+    cache = ResultCache(maxsize=2)
+    plan = FilterPlan(is_palindrome=True)
+    assert cache.get(plan, 1) is None
+    cache.put(plan, 1, ("a",))
+    assert cache.get(plan, 1) == ("a",)
+    assert cache.get(plan, 2) is None
+    assert cache.get(plan, 1) is None
@@ -0,0 +1,107 @@
+from string_analyzers.string_analyzer import (
+    analyse_string,
+    palindrome,
+    unique_char,
+    word_count,
+    sha256_hash,
+    character_frequency_map,
+)
+
+
+def test_analyse_string_matches_individual_functions():
+    for value in ["racecar", "hello, world!", "  a--b  c ", "ñandú ñ", "x"]:
+        props = analyse_string(value)
+        assert props["length"] == len(value)
+        assert props["is_palindrome"] == palindrome(value)
+        assert props["unique_characters"] == unique_char(value)
+        assert props["word_count"] == word_count(value)
+        assert props["sha256_hash"] == sha256_hash(value)
+        assert props["character_frequency_map"] == character_frequency_map(value)
+
+
+def test_analyse_many_uses_process_pool(monkeypatch):
+    import string_analyzers.string_analyzer as analyzer
+
+    monkeypatch.setattr(analyzer, "PARALLEL_MIN_CHARS", 0)
+    values = ["level", "two words", "abc" * 100]
+    assert analyzer.analyse_many(values) == [analyse_string(v) for v in values]
+    assert analyzer._analysis_pool()._mp_context.get_start_method() != "fork"
+    analyzer.shutdown_analysis_pool()
+    assert analyzer._analysis_pool.cache_info().currsize == 0
+
+
+def test_analyse_many_falls_back_when_pool_breaks(monkeypatch):
+    import multiprocessing
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import lru_cache
+    import string_analyzers.string_analyzer as analyzer
+
+    @lru_cache(maxsize=1)
+    def dying_pool():
+        # every worker exits as it starts, like one that crashed on import
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=os._exit,
+            initargs=(1,),
+        )
+
+    monkeypatch.setattr(analyzer, "PARALLEL_MIN_CHARS", 0)
+    monkeypatch.setattr(analyzer, "_analysis_pool", dying_pool)
+    values = ["level", "two words"]
+    assert analyzer.analyse_many(values) == [analyse_string(v) for v in values]
+    assert dying_pool.cache_info().currsize == 0
+
+
+def test_batch_pool_workers_do_not_rerun_the_entrypoint(tmp_path):
+    """Workers re-import ``start.py`` as their main module."""
+    import os
+    import subprocess
+    import sys
+    import pytest
+
+    pytest.importorskip("uvicorn")
+
+    backend = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    script = tmp_path / "drive_start.py"
+    script.write_text(
+        f"""
+import runpy, sys
+import uvicorn
+sys.path.insert(0, {backend!r})
+from string_analyzers import string_analyzer as analyzer
+
+analyzer.PARALLEL_MIN_CHARS = 0
+
+
+def serve(app, **kwargs):
+    analyzer.analyse_many(["level", "two words"])
+    # a pool whose workers failed would have been dropped
+    print("pool alive:", analyzer._analysis_pool.cache_info().currsize == 1)
+    analyzer.shutdown_analysis_pool()
+
+
+uvicorn.run = serve
+runpy.run_path({os.path.join(backend, "start.py")!r}, run_name="__main__")
+"""
+    )
+    # settings main.py needs before it can be imported
+    required = ["GOOGLE_ALG", "GOOGLE_CLIENT_ID", "JWT_SECRET", "GOOGLE_CLIENT_SECRET"]
+    required += ["GOOGLE_REDIRECT_URI", "GOOGLE_TOKEN_URL"]
+    env = {
+        **{name: "test" for name in required},
+        "JWT_EXP_MINUTES": "5",
+        **os.environ,
+        "PORT": "0",
+        "DATABASE_URL": f"sqlite:///{tmp_path / 'app.db'}",
+    }
+    result = subprocess.run(
+        [sys.executable, str(script)],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert "pool alive: True" in result.stdout, result.stderr[-2000:]
@@ -0,0 +1,446 @@
+import json
+from string_analyzers.schema import analyse_data
+from string_analyzers.storage import AppendLogStore, JSONFileStore
+
+
+def make_record(value):
+    return analyse_data(value).model_dump()
+
+
+def test_append_log_store_replays_log(tmp_path):
+    path = str(tmp_path / "DB.json")
+    store = AppendLogStore(path)
+    store.put(make_record("racecar"))
+    store.put(make_record("hello world"))
+    assert store.delete(make_record("racecar")["id"]) is True
+    assert store.delete("missing") is False
+
+    reopened = AppendLogStore(path)
+    assert len(reopened) == 1
+    assert make_record("hello world")["id"] in reopened
+
+
+def test_append_log_store_ignores_torn_write(tmp_path):
+    path = str(tmp_path / "DB.json")
+    store = AppendLogStore(path)
+    store.put(make_record("level"))
+    with open(store.log_path, "a") as f:
+        f.write('{"op":"put","record":{"id"')
+
+    assert len(AppendLogStore(path)) == 1
+
+
+def test_compaction_writes_legacy_snapshot(tmp_path):
+    path = str(tmp_path / "DB.json")
+    store = AppendLogStore(path, compact_min_entries=2)
+    store.put(make_record("a"))
+    store.put(make_record("b"))
+
+    with open(path) as f:
+        snapshot = json.load(f)
+    assert set(snapshot) == {make_record("a")["id"], make_record("b")["id"]}
+    assert open(store.log_path).read() == ""
+    assert len(AppendLogStore(path)) == 2
+
+
+def test_store_interface_requires_the_core_methods():
+    import pytest
+    from string_analyzers.storage import StringStore
+
+    class Partial(StringStore):
+        def get(self, data_id, frequency_map=True):
+            return None
+
+    with pytest.raises(TypeError, match="abstract"):
+        Partial()
+
+
+def test_import_export_json(tmp_path):
+    legacy = JSONFileStore(str(tmp_path / "legacy.json"))
+    legacy.put(make_record("noon"))
+
+    store = AppendLogStore(str(tmp_path / "DB.json"))
+    assert store.import_json(legacy.path) == 1
+    assert store.import_json(legacy.path) == 0
+
+    out = str(tmp_path / "out.json")
+    store.export_json(out)
+    assert JSONFileStore(out).get(make_record("noon")["id"])["value"] == "noon"
+
+
+def test_indexed_query_matches_linear_scan(tmp_path):
+    values = ["racecar", "hello world", "A man a plan", "noon", "xyz", "abc def g"]
+    indexed = AppendLogStore(str(tmp_path / "DB.json"))
+    scanned = JSONFileStore(str(tmp_path / "scan.json"))
+    for value in values:
+        indexed.put(make_record(value))
+        scanned.put(make_record(value))
+    indexed.delete(make_record("xyz")["id"])
+    scanned.delete(make_record("xyz")["id"])
+
+    cases = [
+        {},
+        {"is_palindrome": True},
+        {"is_palindrome": False, "min_length": 4},
+        {"min_length": 4, "max_length": 11},
+        {"word_count": 1, "contains_character": "O"},
+        {"contains_character": "a", "max_length": 7},
+        {"word_count": 7},
+        {"contains": "LO W"},
+        {"contains": "an", "is_palindrome": False},
+        {"contains": "plan", "contains_character": "m"},
+        {"contains": "zzz"},
+    ]
+    for filters in cases:
+        expected = [r["id"] for r in scanned.query(**filters)]
+        assert [r["id"] for r in indexed.query(**filters)] == expected, filters
+
+    empty = AppendLogStore(str(tmp_path / "empty.json"))
+    empty.put(make_record("racecar"))
+    empty.delete(make_record("racecar")["id"])
+    for store in (empty, AppendLogStore(str(tmp_path / "never.json"))):
+        for filters in cases + [{"is_palindrome": True, "min_length": 1}]:
+            assert store.query(**filters) == [], filters
+
+
+def test_save_many_dedupes_within_batch_and_store(tmp_path, monkeypatch):
+    import string_analyzers.schema as schema
+
+    store = AppendLogStore(str(tmp_path / "DB.json"))
+    store.put(make_record("old"))
+    monkeypatch.setattr(schema, "get_store", lambda: store)
+
+    out = schema.save_many_to_db(["new", "old", "new", "", 3])
+    assert [r["status"] for r in out["results"]] == [201, 409, 409, 400, 422]
+    assert out["created"] == 1
+    assert len(store) == 2
+    assert len(open(store.log_path).read().splitlines()) == 2
+
+
+def test_save_many_reports_ids_stored_by_a_concurrent_batch(tmp_path, monkeypatch):
+    from sqlmodel import create_engine
+    import string_analyzers.schema as schema
+    from string_analyzers.sql_store import SQLStringStore
+
+    store = SQLStringStore(create_engine(f"sqlite:///{tmp_path / 'strings.db'}"))
+    store.put(make_record("old"))
+    monkeypatch.setattr(schema, "get_store", lambda: store)
+    # "old" is stored by another writer after both the request and the
+    # first insert attempt looked for it
+    lookups = []
+    real_lookup = store._existing_ids
+
+    def stale_lookup(session, ids):
+        lookups.append(ids)
+        return set() if len(lookups) <= 2 else real_lookup(session, ids)
+
+    monkeypatch.setattr(store, "_existing_ids", stale_lookup)
+
+    out = schema.save_many_to_db(["old", "new"])
+    assert [r["status"] for r in out["results"]] == [409, 201]
+    assert (out["created"], out["conflicts"]) == (1, 1)
+    assert len(store) == 2
+    assert store.stats()["count"] == 2
+
+
+def test_iter_query_pages_by_cursor(tmp_path):
+    values = [f"value {i}" for i in range(7)]
+    for store in (
+        AppendLogStore(str(tmp_path / "DB.json")),
+        JSONFileStore(str(tmp_path / "scan.json")),
+    ):
+        store.put_many(make_record(v) for v in values)
+        expected = sorted(make_record(v)["id"] for v in values)
+
+        seen, cursor = [], None
+        while True:
+            page = list(store.iter_query(min_length=1, after=cursor, limit=3))
+            if not page:
+                break
+            seen.extend(r["id"] for r in page)
+            cursor = page[-1]["id"]
+        assert seen == expected
+
+
+def test_ndjson_pages_end_with_the_next_cursor(tmp_path, monkeypatch):
+    from sqlmodel import create_engine
+    import string_analyzers.sql_store as sql_store
+    from string_analyzers.schema import stream_ndjson
+
+    # several round trips per page on the SQL store
+    monkeypatch.setattr(sql_store, "ITER_BATCH_SIZE", 2)
+    values = [f"value {i}" for i in range(7)]
+    engine = create_engine(f"sqlite:///{tmp_path / 'strings.db'}")
+    for store in (
+        AppendLogStore(str(tmp_path / "DB.json")),
+        sql_store.SQLStringStore(engine),
+    ):
+        store.put_many(make_record(v) for v in values)
+        expected = sorted(make_record(v)["id"] for v in values)
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            # what GET /strings?format=ndjson&limit=3 does
+            results = store.iter_query(after=cursor, limit=4)
+            lines = [json.loads(line) for line in stream_ndjson(results, 3)]
+            pages += 1
+            cursor = lines[-1].get("next_cursor")
+            seen.extend(r["id"] for r in lines if "id" in r)
+            if cursor is None:
+                break
+        assert seen == expected
+        assert pages == 3
+
+
+def test_stores_on_same_files_see_each_others_writes(tmp_path):
+    path = str(tmp_path / "DB.json")
+    first = AppendLogStore(path, compact_min_entries=3)
+    second = AppendLogStore(path, compact_min_entries=3)
+
+    first.put(make_record("one"))
+    second.put(make_record("two"))
+    assert len(first) == 2
+
+    # pushes the first store past the compaction threshold
+    first.put(make_record("three"))
+    second.delete(make_record("one")["id"])
+    assert make_record("one")["id"] not in first
+    assert len(first) == len(second) == 2
+
+
+def test_concurrent_writers_do_not_lose_writes(tmp_path):
+    import threading
+
+    path = str(tmp_path / "DB.json")
+    stores = [AppendLogStore(path, compact_min_entries=5) for _ in range(4)]
+
+    def write(n, store):
+        for i in range(25):
+            store.put(make_record(f"worker {n} value {i}"))
+
+    threads = [
+        threading.Thread(target=write, args=(n, s)) for n, s in enumerate(stores)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(AppendLogStore(path)) == 100
+
+
+def test_concurrent_puts_of_one_value_store_it_once(tmp_path):
+    import threading
+
+    for name, make_store in [
+        ("DB.json", lambda p: AppendLogStore(p, compact_min_entries=5)),
+        ("scan.json", JSONFileStore),
+    ]:
+        path = str(tmp_path / name)
+        stores = [make_store(path) for _ in range(4)]
+        stored = []
+
+        def write(store):
+            for i in range(10):
+                if store.put_if_absent(make_record(f"value {i}")):
+                    stored.append(i)
+
+        threads = [threading.Thread(target=write, args=(s,)) for s in stores]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert sorted(stored) == list(range(10)), name
+        assert len(make_store(path)) == 10
+
+
+def test_append_after_torn_write_keeps_new_entry(tmp_path):
+    path = str(tmp_path / "DB.json")
+    store = AppendLogStore(path)
+    store.put(make_record("first"))
+    with open(store.log_path, "a") as f:
+        f.write('{"op":"put","rec')
+
+    store.put(make_record("second"))
+    assert len(AppendLogStore(path)) == 2
+
+
+def test_corrupt_snapshot_is_rebuilt_from_backup(tmp_path):
+    path = str(tmp_path / "DB.json")
+    store = AppendLogStore(path, compact_min_entries=2)
+    store.put(make_record("first"))
+    # folds both entries into the snapshot
+    store.put(make_record("second"))
+    store.put(make_record("third"))
+    with open(path, "w") as f:
+        f.write('{"truncated": ')
+
+    values = ["first", "second", "third"]
+    recovered = AppendLogStore(path)
+    assert sorted(r["value"] for r in recovered.values()) == values
+    assert (tmp_path / "DB.json.corrupt").exists()
+    with open(path) as f:
+        assert sorted(r["value"] for r in json.load(f).values()) == values
+
+    # the recovery itself must not lose the log a later one needs
+    recovered.put(make_record("fourth"))
+    with open(path, "w") as f:
+        f.write('{"truncated": ')
+    assert len(AppendLogStore(path)) == 4
+
+
+def test_sql_store_pushes_filters_into_where(tmp_path):
+    from sqlmodel import create_engine
+    from string_analyzers.sql_store import SQLStringStore
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'strings.db'}")
+    store = SQLStringStore(engine)
+    scanned = JSONFileStore(str(tmp_path / "scan.json"))
+    values = ["racecar", "hello world", "A man a plan", "noon", "50%_off"]
+    store.put_many(make_record(v) for v in values)
+    scanned.put_many(make_record(v) for v in values)
+    store.put(make_record("noon"))
+
+    assert len(store) == 5
+    assert store.get(make_record("noon")["id"])["value"] == "noon"
+    for filters in [
+        {},
+        {"is_palindrome": True},
+        {"min_length": 4, "max_length": 11, "word_count": 2},
+        {"contains_character": "A"},
+        {"contains_character": "%"},
+        {"contains": "LO W"},
+        {"min_length": 1, "after": make_record("noon")["id"], "limit": 2},
+    ]:
+        expected = [r["id"] for r in scanned.query(**filters)]
+        assert [r["id"] for r in store.query(**filters)] == expected, filters
+
+    assert store.delete(make_record("noon")["id"]) is True
+    assert store.delete(make_record("noon")["id"]) is False
+
+
+def test_substring_search_covers_values_too_long_for_trigrams(tmp_path, monkeypatch):
+    import string_analyzers.index as index
+
+    monkeypatch.setattr(index, "TRIGRAM_MAX_LENGTH", 10)
+    store = AppendLogStore(str(tmp_path / "DB.json"))
+    store.put(make_record("short abc"))
+    store.put(make_record("a much longer value with abc inside"))
+    store.put(make_record("nothing here at all"))
+
+    found = {r["value"] for r in store.query(contains="ABC")}
+    assert found == {"short abc", "a much longer value with abc inside"}
+
+
+def test_stats_are_maintained_incrementally(tmp_path):
+    from sqlmodel import create_engine
+    from string_analyzers.sql_store import SQLStringStore
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'strings.db'}")
+    stores = [
+        AppendLogStore(str(tmp_path / "DB.json")),
+        JSONFileStore(str(tmp_path / "scan.json")),
+        SQLStringStore(engine),
+    ]
+    for store in stores:
+        store.put_many(make_record(v) for v in ["noon", "Aa bb", "racecar", "xyz"])
+        store.put(make_record("noon"))
+        store.delete(make_record("xyz")["id"])
+
+    expected = {
+        "count": 3,
+        "palindrome_count": 2,
+        "palindrome_ratio": 2 / 3,
+        "length_histogram": {"4-7": 3},
+        "word_count_histogram": {"1": 2, "2-3": 1},
+        "character_frequency_map": {
+            "n": 2,
+            "o": 2,
+            "A": 1,
+            "a": 3,
+            " ": 1,
+            "b": 2,
+            "r": 2,
+            "c": 2,
+            "e": 1,
+        },
+    }
+    for store in stores:
+        assert store.stats() == expected, type(store).__name__
+
+    # aggregates of a database that predates the tables are rebuilt once
+    from string_analyzers.sql_store import StringAggregate, StringCharFrequency
+
+    StringAggregate.__table__.drop(engine)
+    StringCharFrequency.__table__.drop(engine)
+    assert SQLStringStore(engine).stats() == expected
+
+
+def test_columnar_snapshot_round_trips_records(tmp_path):
+    from string_analyzers.columnar import read_columnar, write_columnar
+
+    records = {r["id"]: r for r in map(make_record, ["noon", "héllo wörld", "a", "ab"])}
+    path = tmp_path / "DB.strcol"
+    with open(path, "wb") as f:
+        write_columnar(f, records.values())
+
+    assert read_columnar(str(path)) == records
+
+
+def test_columnar_store_survives_compaction_and_reopen(tmp_path):
+    path = str(tmp_path / "DB.strcol")
+    store = AppendLogStore(path, compact_min_entries=2, snapshot_format="columnar")
+    store.put_many(make_record(v) for v in ["noon", "Aa bb", "racecar", "xyz"])
+    store.delete(make_record("xyz")["id"])
+    store.put(make_record("level"))
+
+    reopened = AppendLogStore(path, snapshot_format="columnar")
+    assert reopened.get(make_record("noon")["id"]) == store.get(
+        make_record("noon")["id"]
+    )
+    assert make_record("xyz")["id"] not in reopened
+    # the index is only built once a filtered query needs it
+    assert reopened._index is None
+    reopened.delete(make_record("racecar")["id"])
+    reopened.put(make_record("kayak"))
+    assert [r["value"] for r in reopened.query(is_palindrome=True)] == sorted(
+        ["noon", "kayak", "level"], key=lambda v: make_record(v)["id"]
+    )
+    reopened.put(make_record("racecar"))
+    assert reopened.stats() == store.stats()
+    assert reopened.stats()["count"] == 5
+
+
+def test_projection_skips_frequency_map(tmp_path):
+    from sqlmodel import create_engine
+    from string_analyzers.schema import parse_fields, project_record
+    from string_analyzers.sql_store import SQLStringStore
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'strings.db'}")
+    columnar = AppendLogStore(
+        str(tmp_path / "DB.strcol"), compact_min_entries=1, snapshot_format="columnar"
+    )
+    stores = [
+        AppendLogStore(str(tmp_path / "DB.json")),
+        columnar,
+        JSONFileStore(str(tmp_path / "scan.json")),
+        SQLStringStore(engine),
+    ]
+    noon = make_record("noon")
+    fields = parse_fields("id,properties.length,is_palindrome")
+    for store in stores:
+        store.put_many(make_record(v) for v in ["noon", "Aa bb", "racecar"])
+        record = store.get(noon["id"], frequency_map=False)
+        assert "character_frequency_map" not in record["properties"]
+        assert store.get(noon["id"])["properties"]["character_frequency_map"] == {
+            "n": 2,
+            "o": 2,
+        }
+        projected = [
+            project_record(r, fields)
+            for r in store.iter_query(contains="oo", frequency_map=False)
+        ]
+        assert projected == [
+            {"id": noon["id"], "properties": {"length": 4, "is_palindrome": True}}
+        ]